@@ -0,0 +1,81 @@
+"""
+Compare the streaming ID extractor with the BeautifulSoup path on saved tag pages.
+
+    python bench/bench_extract.py [page.html ...] [--repeat N]
+
+Without page arguments it uses the pages dumped into _debug/ by a run with
+SAVE_HTML_DEBUG = True, or a synthetic 48-thumbnail page if there are none.
+"""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import zerochan_watch as zw  # noqa: E402
+
+
+def synthetic_page(n: int = 48) -> str:
+    items = []
+    for i in range(n):
+        img_id = 4572543 - i * 7
+        ext = "png" if i % 5 == 0 else "jpg"
+        items.append(
+            f'<li class="" data-id="{img_id}">'
+            f'<div><a class="thumb" href="/{img_id}" tabindex="1">'
+            f'<img src="https://s1.zerochan.net/Artoria.Caster.240.{img_id}.jpg" alt="Artoria Caster" '
+            f'width="240" height="240"></a></div>'
+            f'<p><a href="https://static.zerochan.net/Artoria.Caster.full.{img_id}.{ext}" tabindex="-1" '
+            f'class="download" title="Download">1200x1800</a>'
+            f'<a class="fav" data-id="{img_id}" href="#">♡</a></p>'
+            f'<p><a href="/Artoria+Caster">Artoria Caster</a></p></li>'
+        )
+    nav = "".join(f'<a href="/Artoria+Caster?p={p}">{p}</a>' for p in range(1, 20))
+    return (
+        "<!DOCTYPE html><html><head><title>Artoria Caster</title>"
+        + "<script>var x = 1;</script>" * 20
+        + '</head><body><div id="wrapper"><nav>' + nav + "</nav>"
+        + '<ul id="thumbs2">' + "".join(items) + "</ul>"
+        + '<div id="footer">' + "<p>footer</p>" * 50 + "</div></div></body></html>"
+    )
+
+
+def slow_path(html: str):
+    ul = zw.find_thumbs_ul(BeautifulSoup(html, "lxml"))
+    return zw.extract_ids_from_ul(ul) if ul else []
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("pages", nargs="*", type=Path)
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+    zw.DEBUG = False
+
+    pages = args.pages or sorted(zw.DEBUG_DIR.glob("*.html"))
+    samples = [(p.name, p.read_text(encoding="utf-8")) for p in pages]
+    if not samples:
+        samples = [("synthetic (48 thumbs)", synthetic_page())]
+
+    print(f"{'page':40} {'ids':>5} {'soup ms':>9} {'fast ms':>9} {'speedup':>8}")
+    total_slow = total_fast = 0.0
+    for name, html in samples:
+        fast_ids = zw.extract_ids_fast(html)
+        slow_ids = slow_path(html)
+        if fast_ids and fast_ids != slow_ids:
+            print(f"  !! {name}: fast path disagrees ({len(fast_ids)} vs {len(slow_ids)} ids)")
+        t_slow = timeit.timeit(lambda: slow_path(html), number=args.repeat) / args.repeat
+        t_fast = timeit.timeit(lambda: zw.extract_ids_fast(html), number=args.repeat) / args.repeat
+        total_slow += t_slow
+        total_fast += t_fast
+        print(f"{name[:40]:40} {len(slow_ids):>5} {t_slow * 1e3:>9.2f} {t_fast * 1e3:>9.2f} "
+              f"{t_slow / t_fast:>7.1f}x")
+    if len(samples) > 1:
+        print(f"{'total':40} {'':>5} {total_slow * 1e3:>9.2f} {total_fast * 1e3:>9.2f} "
+              f"{total_slow / total_fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
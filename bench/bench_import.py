@@ -0,0 +1,71 @@
+"""
+Import-time benchmark: how long `import zerochan_watch` takes in a fresh interpreter.
+
+    python bench/bench_import.py [--runs 10] [--max-ms 150]
+
+Each run starts a new Python process, times the import and lists which heavy
+optional modules (requests, bs4, lxml, Playwright, httpx, asyncio) it pulled in.
+They should all load lazily, on first use. Exits with status 1 if any of
+them is imported eagerly or the median time is over --max-ms. That makes it
+usable as a check between commits; --json prints the numbers.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY = ("requests", "bs4", "lxml", "playwright", "httpx", "asyncio")
+
+PROBE = f"""
+import json, sys, time
+sys.path.insert(0, {str(ROOT)!r})
+t0 = time.perf_counter()
+import zerochan_watch
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"ms": elapsed * 1000,
+                  "heavy": [m for m in {HEAVY!r} if m in sys.modules]}}))
+"""
+
+
+def probe() -> dict:
+    out = subprocess.run([sys.executable, "-c", PROBE], check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--runs", type=int, default=10, help="fresh interpreters to time")
+    ap.add_argument("--max-ms", type=float, default=150.0, help="budget for the median import")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    probe()  # warm the bytecode cache so the first run is not an outlier
+    samples = [probe() for _ in range(args.runs)]
+    times = [s["ms"] for s in samples]
+    heavy = sorted({m for s in samples for m in s["heavy"]})
+    result = {
+        "runs": args.runs,
+        "median_ms": round(statistics.median(times), 1),
+        "min_ms": round(min(times), 1),
+        "max_ms": round(max(times), 1),
+        "eager_heavy_imports": heavy,
+        "ok": not heavy and statistics.median(times) <= args.max_ms,
+    }
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"import zerochan_watch: median {result['median_ms']} ms "
+              f"(min {result['min_ms']}, max {result['max_ms']}) over {args.runs} runs")
+        print(f"  heavy modules imported eagerly: {', '.join(heavy) or 'none'}")
+        if not result["ok"]:
+            print(f"  FAIL: budget is {args.max_ms} ms with no eager heavy imports")
+    sys.exit(0 if result["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+End-to-end throughput benchmark: run() against a local Zerochan stand-in.
+
+    python bench/bench_run.py [--subs 20] [--ids 150] [--workers 4] [--runs 2]
+
+Starts bench/fake_zerochan.py, points the scraper at it with a throwaway
+download folder and no politeness delays, runs run() (a second run shows
+the warm, steady-state path) and reports pages/s, images/s, bytes/s, peak
+RSS and time spent per phase (from zerochan_watch.METRICS). --json prints
+the same numbers as JSON so results can be compared between commits.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import zerochan_watch as zw  # noqa: E402
+from fake_zerochan import FakeZerochan  # noqa: E402
+
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 2**20
+        except (ImportError, AttributeError):
+            return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def configure(site: FakeZerochan, workdir: Path, workers: int) -> None:
+    subs_file = workdir / "subscriptions.txt"
+    subs_file.write_text("\n".join(site.tags) + "\n", encoding="utf-8")
+    dest = workdir / "Zerochan"
+    dest.mkdir()
+
+    zw.DEBUG = False
+    zw.SUBSCRIPTIONS_FILE = subs_file
+    zw.DEST_DIR = dest
+    zw.STATE_DB = dest / "_state.sqlite3"
+    zw.PAGE_CACHE_DB = dest / "_page_cache.sqlite3"
+    zw.QUEUE_DB = dest / "_queue.sqlite3"
+    zw.BLOB_DIR = dest / "_blobs"
+    zw.SEEN_FILTER = dest / "_seen.bloom"
+    zw.TOMBSTONE_FILTER = dest / "_tombstones.bloom"
+    zw.PW_STATE_FILE = dest / "_pw_state.json"
+    zw.PW_UA_FILE = dest / "_pw_user_agent.txt"
+    zw.WWW_BASE = site.www_base
+    zw.STATIC_BASE = site.static_base
+    zw.WORKERS = workers
+    zw.RATE_LIMITER = zw.RateLimiter({}, 0, 1)  # no politeness delays
+    zw.ADAPTIVE_POLLING = False  # every run checks every subscription
+
+
+def library_bytes(dest: Path) -> int:
+    # each blob once, however many folders link to it
+    files = {(st.st_dev, st.st_ino): st.st_size for st in
+             (p.stat() for p in dest.rglob("*") if p.is_file() and p.suffix.lower() in (".jpg", ".png"))}
+    return sum(files.values())
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--subs", type=int, default=20, help="subscriptions served")
+    ap.add_argument("--ids", type=int, default=150, help="images per subscription")
+    ap.add_argument("--image-kb", type=int, default=50, help="size of each image")
+    ap.add_argument("--latency-ms", type=float, default=5.0, help="server latency per response")
+    ap.add_argument("--guard-every", type=int, default=0, help="every Nth tag page is a guard page")
+    ap.add_argument("--full-links", action="store_true",
+                    help="tag pages link the full-size files (extension hints)")
+    ap.add_argument("--workers", type=int, default=zw.WORKERS)
+    ap.add_argument("--backend", choices=("requests", "httpx"), default=zw.FETCH_BACKEND)
+    ap.add_argument("--runs", type=int, default=2, help="runs against the same library")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    site = FakeZerochan.build(args.subs, args.ids, image_bytes=args.image_kb * 1024,
+                              latency=args.latency_ms / 1000, guard_every=args.guard_every,
+                              full_links=args.full_links).start()
+    snapshots = []
+    zw.METRICS.add_sink(snapshots.append)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="zc-bench-") as tmp:
+        configure(site, Path(tmp), args.workers)
+        zw.FETCH_BACKEND = args.backend
+        for n in range(1, args.runs + 1):
+            pages0, images0 = site.page_requests, site.image_requests
+            bytes0 = library_bytes(zw.DEST_DIR)
+            with open(os.devnull, "w") as quiet:
+                stdout, sys.stdout = sys.stdout, quiet
+                t0 = time.perf_counter()
+                try:
+                    zw.run()
+                finally:
+                    elapsed = time.perf_counter() - t0
+                    sys.stdout = stdout
+            pages = site.page_requests - pages0
+            images = site.image_requests - images0
+            saved = library_bytes(zw.DEST_DIR) - bytes0
+            results.append({
+                "run": n,
+                "seconds": round(elapsed, 3),
+                "page_requests": pages,
+                "image_requests": images,
+                "bytes_saved": saved,
+                "pages_per_s": round(pages / elapsed, 1),
+                "images_per_s": round(images / elapsed, 1),
+                "bytes_per_s": round(saved / elapsed),
+                "peak_rss_mb": round(peak_rss_mb(), 1),
+                "phases": {p: {"calls": st["count"], "seconds": round(st["seconds"], 3),
+                               "bytes": st["bytes"], "errors": st["errors"]}
+                           for p, st in snapshots[-1]["phases"].items()},
+            })
+    site.stop()
+
+    if args.json:
+        print(json.dumps({"config": vars(args), "runs": results}, indent=2))
+        return
+    print(f"{args.subs} subscriptions x {args.ids} ids, {args.workers} workers, "
+          f"backend={args.backend}, latency={args.latency_ms}ms")
+    for r in results:
+        print(f"\nrun {r['run']}: {r['seconds']:.2f}s  "
+              f"{r['pages_per_s']} pages/s  {r['images_per_s']} images/s  "
+              f"{r['bytes_per_s'] / 2**20:.1f} MiB/s  peak RSS {r['peak_rss_mb']} MiB")
+        print(f"  requests: {r['page_requests']} pages, {r['image_requests']} images, "
+              f"{r['bytes_saved'] / 2**20:.1f} MiB saved")
+        for phase, p in r["phases"].items():
+            print(f"  {phase:10} {p['calls']:>6} calls {p['seconds']:>9.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Local stand-in for www.zerochan.net and static.zerochan.net.
+
+Serves tag pages with `ul#thumbs2` markup and `?p=N` paging (newest first,
+with ETags, optionally linking each full-size file the way the site's
+download buttons do), optional "Just a moment..." guard pages, and full-size images
+as a mix of .jpg, .png and missing (404) files. The two sites listen on
+separate ports so the scraper's per-host limits see two hosts.
+
+    site = FakeZerochan.build(subscriptions=20, ids_per_sub=150)
+    site.start()
+    ...  # point WWW_BASE / STATIC_BASE at site.www_base / site.static_base
+    site.stop()
+"""
+import hashlib
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import quote, unquote, urlsplit, parse_qs
+
+GUARD_HTML = (b"<!DOCTYPE html><html><head><title>Just a moment...</title></head>"
+              b"<body>Checking your browser before accessing zerochan.net.</body></html>")
+
+
+class FakeZerochan:
+    def __init__(self, tags: Dict[str, List[int]], per_page: int = 24,
+                 image_bytes: int = 50_000, latency: float = 0.0, guard_every: int = 0,
+                 full_links: bool = False):
+        self.tags = tags                # subscription ("Name+Words") -> ids, newest first
+        self.per_page = per_page
+        self.image_bytes = image_bytes
+        self.latency = latency          # seconds added to every response
+        self.guard_every = guard_every  # every Nth tag-page request gets a guard page (0 = never)
+        self.full_links = full_links    # tag pages link each image's full-size file
+        self._slugs = {quote(sub, safe="+"): sub for sub in tags}
+        self._lock = threading.Lock()
+        self.page_requests = 0
+        self.image_requests = 0
+        self.not_found = 0
+        self.bytes_sent = 0
+        self._servers: List[ThreadingHTTPServer] = []
+
+    @classmethod
+    def build(cls, subscriptions: int = 20, ids_per_sub: int = 150, overlap: int = 10,
+              **kwargs) -> "FakeZerochan":
+        """Subscriptions `Bench+Tag+NNN`; neighbours share `overlap` IDs."""
+        tags = {}
+        stride = max(1, ids_per_sub - overlap)
+        for i in range(subscriptions):
+            start = 4_000_000 + i * stride
+            tags[f"Bench+Tag+{i:03d}"] = list(range(start + ids_per_sub - 1, start - 1, -1))
+        return cls(tags, **kwargs)
+
+    # ---- content ----
+    @staticmethod
+    def extension(img_id: int) -> Optional[str]:
+        """Real extension of an image, or None when it is gone (404 for both)."""
+        if img_id % 17 == 0:
+            return None
+        return ".png" if img_id % 5 == 0 else ".jpg"
+
+    def image_ids(self) -> List[int]:
+        return sorted({i for ids in self.tags.values() for i in ids})
+
+    def tag_page(self, sub: str, page: int) -> bytes:
+        ids = self.tags[sub][(page - 1) * self.per_page: page * self.per_page]
+        dots = sub.replace("+", ".")
+        items = []
+        for img_id in ids:
+            ext = self.extension(img_id)
+            full = (f'<a class="download" href="{self.static_base}/{dots}.full.{img_id}{ext}">full</a>'
+                    if self.full_links and ext else "")
+            items.append(
+                f'<li data-id="{img_id}"><div><a class="thumb" href="/{img_id}">'
+                f'<img src="{self.static_base}/{dots}.240.{img_id}.jpg" alt="{sub}"></a></div>'
+                f'<p><a class="fav" data-id="{img_id}" href="#">fav</a>{full}</p></li>'
+            )
+        pages = (len(self.tags[sub]) + self.per_page - 1) // self.per_page
+        nav = "".join(f'<a href="/{quote(sub, safe="+")}?p={p}">{p}</a>' for p in range(1, pages + 1))
+        return (f'<!DOCTYPE html><html><head><title>{sub}</title></head><body>'
+                f'<nav>{nav}</nav><ul id="thumbs2">{"".join(items)}</ul></body></html>').encode()
+
+    def image(self, img_id: int) -> bytes:
+        seed = hashlib.sha256(str(img_id).encode()).digest()
+        return (seed * (self.image_bytes // len(seed) + 1))[: self.image_bytes]
+
+    # ---- servers ----
+    def start(self) -> "FakeZerochan":
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None):
+                if site.latency:
+                    time.sleep(site.latency)
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body and self.command != "HEAD":
+                    self.wfile.write(body)
+                with site._lock:
+                    site.bytes_sent += len(body)
+
+        class WwwHandler(Handler):
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                sub = site._slugs.get(parts.path.lstrip("/"))
+                if sub is None:
+                    return self.reply(404)
+                page = int(parse_qs(parts.query).get("p", ["1"])[0])
+                with site._lock:
+                    site.page_requests += 1
+                    guarded = site.guard_every and site.page_requests % site.guard_every == 0
+                if guarded:
+                    return self.reply(503, GUARD_HTML, {"Content-Type": "text/html"})
+                body = site.tag_page(sub, page)
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    return self.reply(304, b"", {"ETag": etag})
+                self.reply(200, body, {"Content-Type": "text/html; charset=utf-8", "ETag": etag})
+
+        class StaticHandler(Handler):
+            rx = re.compile(r"^/(?P<name>.+)\.full\.(?P<id>\d+)(?P<ext>\.(?:jpg|png))$")
+
+            def do_GET(self):
+                with site._lock:
+                    site.image_requests += 1
+                m = self.rx.match(unquote(urlsplit(self.path).path))
+                if not m or site.extension(int(m.group("id"))) != m.group("ext"):
+                    with site._lock:
+                        site.not_found += 1
+                    return self.reply(404, b"Not Found")
+                body = site.image(int(m.group("id")))
+                ctype = "image/png" if m.group("ext") == ".png" else "image/jpeg"
+                rng = re.match(r"bytes=(\d+)-$", self.headers.get("Range", ""))
+                if rng and int(rng.group(1)) < len(body):
+                    start = int(rng.group(1))
+                    return self.reply(206, body[start:], {
+                        "Content-Type": ctype, "Accept-Ranges": "bytes",
+                        "Content-Range": f"bytes {start}-{len(body) - 1}/{len(body)}"})
+                self.reply(200, body, {"Content-Type": ctype, "Accept-Ranges": "bytes"})
+
+            do_HEAD = do_GET
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+
+            def handle_error(self, request, client_address):
+                # clients closing keep-alive connections are not worth a traceback
+                if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+                    super().handle_error(request, client_address)
+
+        for handler in (WwwHandler, StaticHandler):
+            server = Server(("127.0.0.1", 0), handler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+        return self
+
+    @property
+    def www_base(self) -> str:
+        return "http://127.0.0.1:%d" % self._servers[0].server_address[1]
+
+    @property
+    def static_base(self) -> str:
+        return "http://127.0.0.1:%d" % self._servers[1].server_address[1]
+
+    def stop(self) -> None:
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
@@ -0,0 +1,48 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "bench"))
+
+import zerochan_watch as zw  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def no_politeness(monkeypatch):
+    """No per-host delays, and a fresh metrics run, for every test."""
+    monkeypatch.setattr(zw, "RATE_LIMITER", zw.RateLimiter({}, 0, 1))
+    zw.METRICS.reset()
+
+
+@pytest.fixture
+def site():
+    from fake_zerochan import FakeZerochan
+    site = FakeZerochan.build(subscriptions=3, ids_per_sub=40, image_bytes=2000).start()
+    yield site
+    site.stop()
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch, site):
+    """Index, page cache and queue in a throwaway library pointed at the fake site."""
+    dest = tmp_path / "Zerochan"
+    dest.mkdir()
+    subs_file = tmp_path / "subscriptions.txt"
+    subs_file.write_text("\n".join(site.tags) + "\n", encoding="utf-8")
+    for name, value in {
+        "DEBUG": False, "SUBSCRIPTIONS_FILE": subs_file, "DEST_DIR": dest,
+        "STATE_DB": dest / "_state.sqlite3", "PAGE_CACHE_DB": dest / "_page_cache.sqlite3",
+        "QUEUE_DB": dest / "_queue.sqlite3", "BLOB_DIR": dest / "_blobs",
+        "SEEN_FILTER": dest / "_seen.bloom", "TOMBSTONE_FILTER": dest / "_tombstones.bloom",
+        "BLOOM_CAPACITY": 10_000, "PW_STATE_FILE": dest / "_pw_state.json",
+        "PW_UA_FILE": dest / "_pw_user_agent.txt", "WWW_BASE": site.www_base,
+        "STATIC_BASE": site.static_base, "ADAPTIVE_POLLING": False, "FETCH_BACKEND": "requests",
+    }.items():
+        monkeypatch.setattr(zw, name, value)
+    zw.SHUTDOWN.clear()
+    zw._open_stores()
+    yield dest
+    zw._close_stores()
@@ -0,0 +1,78 @@
+import pytest
+
+import zerochan_watch as zw
+
+IMG = 4000001  # a .jpg on the fake site
+
+
+@pytest.fixture
+def image(site, monkeypatch):
+    monkeypatch.setattr(zw, "FETCH_BACKEND", "requests")
+    sub = next(iter(site.tags))
+    return f"{site.static_base}/{sub.replace('+', '.')}.full.{IMG}.jpg", site.image(IMG)
+
+
+def test_download_goes_through_a_part_file(tmp_path, image):
+    url, body = image
+    dest = tmp_path / "x_4000001.jpg"
+    assert zw.http_download(url, dest).status_code == 200
+    assert dest.read_bytes() == body
+    assert not zw.part_path(dest).exists()
+
+
+def test_interrupted_download_resumes_with_range(tmp_path, image, site):
+    url, body = image
+    dest = tmp_path / "x_4000001.jpg"
+    zw.part_path(dest).write_bytes(body[:700])
+    sent = site.bytes_sent
+    assert zw.http_download(url, dest).status_code == 200
+    assert dest.read_bytes() == body
+    assert site.bytes_sent - sent == len(body) - 700   # only the rest came over the wire
+
+
+def test_oversized_part_starts_over(tmp_path, image):
+    url, body = image
+    dest = tmp_path / "x_4000001.jpg"
+    zw.part_path(dest).write_bytes(b"\0" * (len(body) + 10))  # server ignores the Range: 200
+    assert zw.http_download(url, dest).status_code == 200
+    assert dest.read_bytes() == body
+
+
+def test_missing_image_leaves_nothing_behind(tmp_path, site, monkeypatch):
+    monkeypatch.setattr(zw, "FETCH_BACKEND", "requests")
+    sub = next(iter(site.tags))
+    dest = tmp_path / "x_4000015.jpg"
+    url = f"{site.static_base}/{sub.replace('+', '.')}.full.4000015.jpg"
+    assert zw.http_download(url, dest).status_code == 404
+    assert not dest.exists() and not zw.part_path(dest).exists()
+
+
+def test_part_mode():
+    assert zw._part_mode(200, {}, 500) == "wb"
+    assert zw._part_mode(206, {"Content-Range": "bytes 500-999/1000"}, 500) == "ab"
+    assert zw._part_mode(206, {"Content-Range": "bytes 0-999/1000"}, 500) is None
+    assert zw._part_mode(404, {}, 0) is None
+
+
+def test_finish_part(tmp_path):
+    dest = tmp_path / "a_1.jpg"
+    part = zw.part_path(dest)
+
+    part.write_bytes(b"x" * 10)
+    with pytest.raises(zw.IncompleteDownload):
+        zw._finish_part(part, dest, 200, {"Content-Length": "20"}, 0)
+    assert part.exists() and not dest.exists()        # kept for resuming
+
+    assert zw._finish_part(part, dest, 206, {"Content-Range": "bytes 0-9/10"}, 0) == 200
+    assert dest.read_bytes() == b"x" * 10
+
+    part.write_bytes(b"y")
+    assert zw._finish_part(part, dest, 416, {}, 1) == 416  # unusable partial: dropped
+    assert not part.exists()
+
+
+def test_part_files_never_count_as_stored(tmp_path):
+    (tmp_path / "Name_1.jpg").write_bytes(b"x")
+    (tmp_path / "Name_2.jpg.part").write_bytes(b"x")
+    (tmp_path / "3.png.part").write_bytes(b"x")
+    assert [f[0] for f in zw.scan_char_folder(tmp_path)] == ["1"]
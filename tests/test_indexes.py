@@ -0,0 +1,52 @@
+import zerochan_watch as zw
+
+
+def test_bloom_filter_has_no_false_negatives_and_persists(tmp_path):
+    path = tmp_path / "f.bloom"
+    bloom = zw.BloomFilter(path, 5000, 0.01)
+    assert bloom.fresh
+    for i in range(0, 10000, 2):
+        bloom.add(i)
+    bloom.close()
+
+    bloom = zw.BloomFilter(path, 5000, 0.01)
+    assert not bloom.fresh
+    assert all(i in bloom and str(i) in bloom for i in range(0, 10000, 2))
+    false_positives = sum(i in bloom for i in range(1, 10000, 2))
+    assert false_positives < 5000 * 0.03
+    bloom.close()
+
+
+def test_bloom_filter_rebuilds_when_corrupt_or_outgrown(tmp_path):
+    path = tmp_path / "f.bloom"
+    path.write_bytes(b"not a filter")
+    bloom = zw.BloomFilter(path, 100, 0.01)
+    assert bloom.fresh
+    for i in range(300):
+        bloom.add(i)
+    bloom.close()
+
+    bloom = zw.BloomFilter(path, 100, 0.01)          # 300 > capacity: bigger, empty
+    assert bloom.fresh and bloom.count == 0
+    for i in range(300):
+        bloom.add(i)
+    bloom.close()
+    assert not zw.BloomFilter(path, 100, 0.01).fresh  # sized for them now: kept
+
+
+def test_state_index_seeds_the_seen_filter(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw, "BLOB_DIR", tmp_path / "_blobs")
+    zw.blob_path("4000123", ".png").parent.mkdir(parents=True)
+    zw.blob_path("4000123", ".png").write_bytes(b"x")
+    index = zw.StateIndex(tmp_path / "s.sqlite3", tmp_path / "seen.bloom")
+    assert index.might_have("4000123")
+    index.close()
+
+
+def test_id_set():
+    ids = zw.IdSet(["30", 10, "20", 20])
+    assert list(ids) == [10, 20, 30] and len(ids) == 3
+    assert "20" in ids and 20 in ids and 25 not in ids
+    assert ids.max() == 30 and zw.IdSet().max() is None
+    assert ids.count_above(10) == 2 and ids.count_above(30) == 0
+    assert ids.difference(zw.IdSet([20, 40])) == zw.IdSet([10, 30])
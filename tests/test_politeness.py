@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+import zerochan_watch as zw
+
+URL = "http://host.test/page"
+
+
+@pytest.fixture
+def shutdown():
+    zw.SHUTDOWN.clear()
+    yield zw.SHUTDOWN
+    zw.SHUTDOWN.clear()
+
+
+def test_retry_after_pause_ends_on_shutdown(shutdown):
+    limiter = zw.RateLimiter({}, 0.0, 1)
+    limiter.observe(URL, 429, {"Retry-After": "600"})
+    zw.threading.Timer(0.2, shutdown.set).start()
+    start = time.monotonic()
+    assert not limiter.acquire(URL)
+    assert time.monotonic() - start < 5
+
+
+def test_interrupted_request_is_not_sent_and_releases_the_probe(shutdown, monkeypatch):
+    limiter = zw.RateLimiter({}, 0.0, 1)
+    limiter.observe(URL, 503, {"Retry-After": "600"})
+    monkeypatch.setattr(zw, "RATE_LIMITER", limiter)
+    breaker = zw.CircuitBreaker(1, 0.0)
+    retry = zw.RetryPolicy({}, 0.0, breaker)
+    breaker.failure(URL)                               # the next request is the probe
+    shutdown.set()
+    sent = []
+    with pytest.raises(zw.Interrupted):
+        retry.call(URL, lambda: sent.append(URL))
+    assert sent == [] and not breaker.probing(URL)
+
+
+def test_shutdown_leaves_the_image_queued(stores, site, shutdown, monkeypatch):
+    limiter = zw.RateLimiter({}, 0.0, 1)
+    limiter.observe(site.static_base + "/", 429, {"Retry-After": "600"})
+    monkeypatch.setattr(zw, "RATE_LIMITER", limiter)
+    zw.DOWNLOAD_QUEUE.put(next(iter(site.tags)), "4000001")
+    zw.threading.Timer(0.2, shutdown.set).start()
+
+    assert zw.drain_queue(zw.DOWNLOAD_QUEUE) == 0
+    assert zw.DOWNLOAD_QUEUE.pending() == 1
+    assert zw.STATE.tombstones() == []
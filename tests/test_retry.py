@@ -0,0 +1,137 @@
+import pytest
+
+import zerochan_watch as zw
+
+URL = "http://host.test/page"
+OK = zw.HttpResponse(200, {}, b"ok", "ok")
+ERROR = zw.HttpResponse(500, {}, b"", "")
+GUARD = zw.HttpResponse(200, {}, b"", "<title>Just a moment...</title>")
+
+
+def make_policy(threshold=2, cooldown=0.0):
+    breaker = zw.CircuitBreaker(threshold, cooldown)
+    policy = {"http_5xx": (0, 0.0), "guard": (0, 0.0), "connection": (2, 0.0)}
+    return zw.RetryPolicy(policy, 0.0, breaker), breaker
+
+
+def test_breaker_opens_after_threshold_and_rejects():
+    retry, breaker = make_policy(threshold=2, cooldown=60.0)
+    for _ in range(2):
+        assert retry.call(URL, lambda: ERROR).status_code == 500
+    assert zw.METRICS.snapshot()["counters"]["breaker_trips"] == 1
+    with pytest.raises(zw.CircuitOpen):
+        retry.call(URL, lambda: OK)
+    # other hosts are unaffected
+    assert retry.call("http://other.test/", lambda: OK) is OK
+
+
+def test_half_open_probe_closes_or_reopens():
+    retry, breaker = make_policy(threshold=1, cooldown=0.0)
+    retry.call(URL, lambda: ERROR)        # open
+    retry.call(URL, lambda: ERROR)        # probe fails: open again
+    assert zw.METRICS.snapshot()["counters"]["breaker_trips"] == 2
+    assert retry.call(URL, lambda: OK) is OK  # probe succeeds: closed
+    circuit = breaker._circuit(URL)
+    assert (circuit.failures, circuit.open_until, circuit.probing) == (0, 0.0, False)
+
+
+def test_guard_page_probe_does_not_wedge_the_circuit():
+    retry, breaker = make_policy(threshold=2, cooldown=0.0)
+    retry.call(URL, lambda: ERROR)
+    retry.call(URL, lambda: ERROR)        # open
+    assert retry.call(URL, lambda: GUARD) is GUARD  # probe gets a guard page
+    assert not breaker._circuit(URL).probing
+    assert retry.call(URL, lambda: OK) is OK
+    assert not breaker._circuit(URL).open_until
+
+
+def test_transport_errors_are_retried_then_raised():
+    retry, _ = make_policy()
+    calls = []
+
+    def attempt():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionResetError("reset")
+        return OK
+
+    assert retry.call(URL, attempt) is OK
+    assert zw.METRICS.snapshot()["counters"]["retry_connection"] == 2
+
+    def always_reset():
+        raise ConnectionResetError("reset")
+
+    with pytest.raises(ConnectionResetError):
+        retry.call("http://other.test/", always_reset)
+    assert zw.METRICS.snapshot()["counters"]["retry_exhausted_connection"] == 1
+
+
+def test_own_errors_are_not_retried_and_release_the_probe():
+    retry, breaker = make_policy(threshold=1, cooldown=0.0)
+    retry.call(URL, lambda: ERROR)  # open
+
+    def disk_full():
+        raise ValueError("not a network error")
+
+    with pytest.raises(ValueError):
+        retry.call(URL, disk_full)
+    assert not breaker._circuit(URL).probing
+
+
+def test_retry_after_overrides_backoff():
+    retry, _ = make_policy()
+    assert retry.delay("http_5xx", 3, {"Retry-After": "7"}) == 7
+    assert 0.5 <= zw.RetryPolicy({"x": (1, 1.0)}, 60, None).delay("x", 0) <= 1.0
+
+
+@pytest.mark.parametrize("exc, kind", [
+    (TimeoutError("t"), "read_timeout"),
+    (ConnectionResetError(), "connection"),
+    (zw.IncompleteDownload("short"), "connection"),
+    (ValueError(), None),
+])
+def test_classify_exception(exc, kind):
+    assert zw.classify_exception(exc) == kind
+
+
+def test_classify_exception_requests():
+    requests = pytest.importorskip("requests")
+    assert zw.classify_exception(requests.exceptions.ConnectTimeout()) == "connect_timeout"
+    assert zw.classify_exception(requests.exceptions.ReadTimeout()) == "read_timeout"
+    try:
+        raise requests.exceptions.ConnectionError("refused") from ConnectionRefusedError()
+    except requests.exceptions.ConnectionError as e:
+        assert zw.classify_exception(e) == "connection"
+
+
+def test_open_circuit_hands_queued_images_back(stores, site, monkeypatch):
+    retry, breaker = make_policy(threshold=1, cooldown=60.0)
+    monkeypatch.setattr(zw, "RETRY", retry)
+    monkeypatch.setattr(zw, "BREAKER_MAX_WAITS", 0)
+    breaker.failure(site.static_base + "/")  # static host cut off
+    sub = next(iter(site.tags))
+    zw.DOWNLOAD_QUEUE.put(sub, "4000001")
+
+    assert zw.drain_queue(zw.DOWNLOAD_QUEUE) == 0
+    assert site.image_requests == 0
+    assert zw.DOWNLOAD_QUEUE.pending() == 1           # still queued
+    assert zw.DOWNLOAD_QUEUE.claim().img_id == "4000001"  # and claimable again
+    assert zw.STATE.tombstones() == []
+
+
+def test_workers_wait_out_a_slow_probe(stores, site, monkeypatch):
+    retry, breaker = make_policy(threshold=1, cooldown=0.0)
+    monkeypatch.setattr(zw, "RETRY", retry)
+    monkeypatch.setattr(zw, "BREAKER_MAX_WAITS", 0)
+    static = site.static_base + "/"
+    breaker.failure(static)
+    assert breaker.allow(static)                       # another worker's probe, still running
+    with pytest.raises(zw.CircuitOpen) as e:
+        retry.call(static, lambda: OK)
+    assert e.value.probing
+
+    zw.threading.Timer(1.5, breaker.success, (static,)).start()  # the probe succeeds
+    zw.DOWNLOAD_QUEUE.put(next(iter(site.tags)), "4000001")
+    zw.DOWNLOAD_QUEUE.stop_feeding()
+    assert zw.drain_queue(zw.DOWNLOAD_QUEUE) == 1
+    assert zw.DOWNLOAD_QUEUE.pending() == 0
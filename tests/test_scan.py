@@ -0,0 +1,104 @@
+import zerochan_watch as zw
+
+
+def queued_ids():
+    with zw.DOWNLOAD_QUEUE._cond:
+        return {r[0] for r in zw.DOWNLOAD_QUEUE._db.execute("SELECT img_id FROM queue")}
+
+
+def failing_page(monkeypatch, bad_page):
+    real = zw.fetch_page_ids
+
+    def fetch(url, refresh=False):
+        return None if url.endswith(f"?p={bad_page}") else real(url, refresh)
+
+    monkeypatch.setattr(zw, "fetch_page_ids", fetch)
+    return real
+
+
+def test_failed_page_keeps_backfill_pending_and_mark(stores, site, monkeypatch):
+    sub = next(iter(site.tags))
+    real = failing_page(monkeypatch, 2)
+
+    result = zw.process_subscription(sub)
+    assert result.queued == 24                       # page 1 only
+    assert zw.STATE.high_water(sub) is None
+    assert zw.STATE.backfill_pending(sub)
+
+    monkeypatch.setattr(zw, "fetch_page_ids", real)
+    result = zw.process_subscription(sub)            # walks deep again
+    assert queued_ids() == {str(i) for i in site.tags[sub]}
+    assert zw.STATE.high_water(sub) == max(site.tags[sub])
+    assert not zw.STATE.backfill_pending(sub)
+
+
+def test_ids_under_the_mark_are_not_known_unless_stored(stores, site):
+    sub = next(iter(site.tags))
+    zw.STATE.set_high_water(sub, max(site.tags[sub]))
+    lost = site.tags[sub][0]
+    folder = stores / zw.folder_name_from_subscription(sub)  # everything stored but one
+    folder.mkdir()
+    for img_id in site.tags[sub][1:]:
+        (folder / f"{sub.replace('+', '.')}_{img_id}.jpg").write_bytes(b"x")
+
+    result = zw.process_subscription(sub)
+    assert result.queued == 1
+    assert queued_ids() == {str(lost)}
+
+
+def test_all_pages_failing_does_not_move_the_mark(stores, site, monkeypatch):
+    sub = next(iter(site.tags))
+    zw.STATE.set_high_water(sub, 1)
+    monkeypatch.setattr(zw, "fetch_page_ids", lambda url, refresh=False: None)
+    assert zw.process_subscription(sub).queued == 0
+    assert zw.STATE.high_water(sub) == 1
+
+
+def test_failed_check_is_postponed_not_planned(stores, site, monkeypatch):
+    sub = next(iter(site.tags))
+    monkeypatch.setattr(zw, "ADAPTIVE_POLLING", True)
+    before = zw.SubSchedule(sub, 0.01, 1000.0, 0.0, 1, 24)   # a quiet tag
+    zw.STATE.save_schedule(before)
+    monkeypatch.setattr(zw, "fetch_page_ids", lambda url, refresh=False: None)
+
+    zw.process_subscription(sub)
+    after = zw.STATE.schedule(sub)
+    assert (after.rate, after.last_check) == (before.rate, before.last_check)
+    assert after.next_check <= zw.time.time() + zw.POLL_MIN_INTERVAL
+
+
+def test_deep_walk_ends_when_pages_repeat(stores, site, monkeypatch):
+    sub = next(iter(site.tags))
+    last = (len(site.tags[sub]) - 1) // site.per_page + 1
+    real = site.tag_page
+    monkeypatch.setattr(site, "tag_page", lambda s, p: real(s, min(p, last)))  # ?p= clamped
+    fetched = []
+    fetch = zw.fetch_page_ids
+    monkeypatch.setattr(zw, "fetch_page_ids",
+                        lambda url, refresh=False: fetched.append(url) or fetch(url, refresh))
+
+    result = zw.process_subscription(sub)
+    assert len(fetched) == last + 1
+    assert result.queued == len(site.tags[sub])
+    assert not zw.STATE.backfill_pending(sub)
+
+
+def test_plan_next_check(monkeypatch):
+    monkeypatch.setattr(zw, "ADAPTIVE_POLLING", True)
+    now = 1_000_000.0
+    first = zw.plan_next_check("s", None, None, 24, now)
+    assert first.rate is None and first.next_check == now + zw.POLL_INTERVAL
+
+    # 10 new in one day: the rate is measured, checks every ~POLL_TARGET_NEW arrivals
+    day = zw.plan_next_check("s", first, 10, 24, now + 86400)
+    assert day.rate == 10
+    assert day.next_check - day.last_check == zw.POLL_TARGET_NEW / 10 * 86400
+
+    quiet = zw.plan_next_check("s", day._replace(rate=0.0), 0, 24, now + 2 * 86400)
+    assert quiet.rate == 0.0
+    assert quiet.next_check - quiet.last_check == zw.POLL_MAX_INTERVAL
+    assert quiet.depth == 1
+
+    busy = zw.plan_next_check("s", day._replace(rate=1e6), 10**6, 24, now + 2 * 86400)
+    assert busy.next_check - busy.last_check == zw.POLL_MIN_INTERVAL
+    assert busy.depth == zw.MAX_PAGES_PER_TAG
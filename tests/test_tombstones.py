@@ -0,0 +1,88 @@
+import zerochan_watch as zw
+
+
+def test_backoff_doubles_per_kind_up_to_the_cap():
+    first, cap = zw.TOMBSTONE_BACKOFF["transient"]
+    assert zw.tombstone_delay("transient", 1) == first
+    assert zw.tombstone_delay("transient", 3) == 4 * first
+    assert zw.tombstone_delay("transient", 99) == cap
+    assert zw.failure_kind([404, 404]) == "missing"
+    assert zw.failure_kind([404, 503]) == "transient"
+    assert zw.failure_kind([0]) == "transient"
+
+
+def test_failures_back_off_and_a_new_kind_starts_over(stores):
+    first = zw.STATE.add_tombstone("4000001", "Sub", "transient", 503)
+    again = zw.STATE.add_tombstone("4000001", "Sub", "transient", 503)
+    assert again.failures == 2 and again.first_failed == first.first_failed
+    missing = zw.STATE.add_tombstone("4000001", "Sub", "missing", 404)
+    assert missing.failures == 1
+    assert zw.STATE.tombstoned("4000001", missing.last_failed)
+    assert not zw.STATE.tombstoned("4000001", missing.retry_at)
+
+
+def test_failed_download_is_requeued_after_backoff(stores, site, monkeypatch):
+    """A page-2 image that failed comes back once its tombstone expires,
+    although later checks stop at the fully stored page 1."""
+    sub = next(iter(site.tags))
+    lost = str(site.tags[sub][30])                    # on page 2
+    real = zw.download_status
+
+    def flaky(url, dest):
+        return 503 if f".{lost}." in url else real(url, dest)
+
+    monkeypatch.setattr(zw, "download_status", flaky)
+    monkeypatch.setattr(zw, "TOMBSTONE_BACKOFF", {"missing": (3600, 3600), "transient": (0, 0)})
+    zw._close_stores()  # run() opens its own
+    zw.run()
+    zw._open_stores()
+    assert [t.img_id for t in zw.STATE.tombstones("transient")] == [lost]
+
+    monkeypatch.setattr(zw, "download_status", real)
+    zw._close_stores()
+    zw.run()
+    zw._open_stores()
+    assert zw.STATE.tombstones("transient") == []
+    folder = stores / zw.folder_name_from_subscription(sub)
+    assert any(p.name.endswith(f"_{lost}.jpg") or p.name.endswith(f"_{lost}.png") for p in folder.iterdir())
+
+
+def test_requeued_image_listed_on_the_page_is_counted_once(stores, site, monkeypatch):
+    sub = next(iter(site.tags))
+    monkeypatch.setattr(zw, "TOMBSTONE_BACKOFF", {"missing": (0, 0), "transient": (0, 0)})
+    zw.STATE.add_tombstone(str(site.tags[sub][0]), sub, "transient", 503)  # expired, on page 1
+
+    result = zw.process_subscription(sub)
+    with zw.DOWNLOAD_QUEUE._cond:
+        (queued,) = zw.DOWNLOAD_QUEUE._db.execute("SELECT count(*) FROM queue").fetchone()
+    assert result.queued == queued == len(site.tags[sub])
+
+
+def test_crashing_fetch_backs_off_instead_of_holding_the_claim(stores, site, monkeypatch):
+    def broken(item):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(zw, "fetch_image", broken)
+    zw.DOWNLOAD_QUEUE.put(next(iter(site.tags)), "4000001")
+    zw.DOWNLOAD_QUEUE.stop_feeding()
+    assert zw.drain_queue(zw.DOWNLOAD_QUEUE) == 0
+    assert zw.DOWNLOAD_QUEUE.pending() == 0
+    assert [(t.img_id, t.kind) for t in zw.STATE.tombstones()] == [("4000001", "transient")]
+
+
+def test_failed_link_skips_only_that_subscription(stores, site, monkeypatch):
+    first, second = list(site.tags)[:2]
+    real = zw.link_file
+
+    def link(src, dest):
+        if dest.parent.name == zw.folder_name_from_subscription(first):
+            raise OSError("disk full")
+        return real(src, dest)
+
+    monkeypatch.setattr(zw, "link_file", link)
+    for sub in (first, second):
+        zw.DOWNLOAD_QUEUE.put(sub, "4000001")
+    zw.DOWNLOAD_QUEUE.stop_feeding()
+    assert zw.drain_queue(zw.DOWNLOAD_QUEUE) == 1
+    assert not zw.image_dest(first, "4000001", ".jpg").exists()
+    assert zw.image_dest(second, "4000001", ".jpg").exists()
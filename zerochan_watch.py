@@ -1,35 +1,184 @@
 import os
 import re
 import time
+import importlib.util
+import email.utils
+import sqlite3
+import hashlib
+import argparse
+import logging
+import logging.handlers
+import queue
+import random
+import socket
+import sys
+import itertools
+import math
+import mmap
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
 import json
 import pathlib
 import shutil
-from typing import List, Set, Dict, Optional
-from urllib.parse import quote, unquote
-import requests
-from bs4 import BeautifulSoup
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, Set, Dict, Optional, Mapping, NamedTuple, Tuple, Union
+from urllib.parse import quote, unquote, urlsplit
 from pathlib import Path
-from playwright.sync_api import sync_playwright
+
+# requests, bs4, lxml, asyncio and Playwright are imported where they are
+# first needed, so importing this module (and short runs) stay cheap; see
+# bench/bench_import.py.
+if TYPE_CHECKING:
+    import asyncio
+    import requests
+    from bs4 import BeautifulSoup
 
 # ================== CONFIG ==================
 
 SCRIPT_DIR = Path(__file__).parent
 SUBSCRIPTIONS_FILE = SCRIPT_DIR / "subscriptions.txt"  # lives next to the script
-DEST_DIR = pathlib.Path.home() / "Pictures" / "Zerochan"
-DEST_DIR.mkdir(parents=True, exist_ok=True)
+DEST_DIR = pathlib.Path.home() / "Pictures" / "Zerochan"  # created by the first run
+
+# Site roots (point these at a local stand-in server for testing)
+WWW_BASE = "https://www.zerochan.net"
+STATIC_BASE = "https://static.zerochan.net"
+
+# Persistent index of downloaded IDs (SQLite, WAL mode). Folders are only
+# rescanned when their mtime changes or when run with --rescan.
+STATE_DB = DEST_DIR / "_state.sqlite3"
+
+# Conditional-GET cache for tag pages: ETag/Last-Modified plus the IDs we
+# extracted, so a 304 skips parsing. Least recently used entries are evicted
+# past PAGE_CACHE_MAX_ENTRIES. --refresh bypasses it.
+PAGE_CACHE_DB = DEST_DIR / "_page_cache.sqlite3"
+PAGE_CACHE_MAX_ENTRIES = 5000
+# Same database: IDs extracted from each distinct page body (keyed by its hash),
+# so a page served unchanged without validators skips HTML parsing too.
+PARSE_CACHE_MAX_ENTRIES = 5000
+
+# Extension prediction: the real .jpg/.png is read from full-size links in
+# the tag-page markup when present, otherwise guessed from what this
+# subscription's folder already holds (png first once EXT_PRIOR_MIN_FILES
+# files are stored and more than half are png). The other extension is only
+# probed if the guess fails.
+EXT_PRIOR_MIN_FILES = 20
 
 # How many pages per tag to scan: page 1 = base URL, page 2 = ?p=2, etc.
 MAX_PAGES_PER_TAG = 3
 
-# Delay between HTTP requests (be gentle)
+# Incremental crawling: tag pages are newest-first, so stop paging as soon as
+# a page holds only IDs we already know (stored, or failed too recently to
+# retry; being at/below the previous run's newest ID proves nothing). Past the
+# expected depth, paging also stops at the first page reaching that ID.
+# MAX_PAGES_PER_TAG stays the upper bound.
+INCREMENTAL = True
+# Deep backfill walks pages until the listing runs out. It is used for brand-new
+# subscriptions (no high-water mark, empty folder) and for every subscription with --backfill.
+# A page that adds no new IDs also ends it (the site clamps or ignores ?p= past the end).
+BACKFILL_NEW_SUBS = True
+BACKFILL_MAX_PAGES = 500  # 0 = no limit
+
+# Sustained delay between HTTP requests to the same host (be gentle).
+# Each host gets a token bucket refilled one token per REQUEST_DELAY seconds,
+# shared by all workers: adding workers never raises the per-host request rate.
+# Only requests that actually hit the network take a token.
 REQUEST_DELAY = 5
+# Requests a host may take back-to-back after being idle
+RATE_BURST = 2
+# Per-host overrides: host -> (delay seconds, burst)
+RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    "www.zerochan.net": (REQUEST_DELAY, 2),
+    "static.zerochan.net": (REQUEST_DELAY, 4),
+}
+# On 429/503 a host's delay doubles up to this many seconds, then eases back on success
+RATE_MAX_DELAY = 120
+# Never honour a Retry-After longer than this (seconds)
+RETRY_AFTER_CAP = 600
+
+# Failed requests are classified and retried per class: class -> (retries,
+# base delay seconds). The n-th retry waits between half and all of
+# base * 2**n (at most RETRY_MAX_DELAY), or the server's Retry-After.
+# Guard pages go straight to the browser unless given retries here.
+RETRY_POLICY: Dict[str, Tuple[int, float]] = {
+    "dns": (1, 5.0),
+    "connect_timeout": (2, 2.0),
+    "read_timeout": (2, 2.0),
+    "connection": (2, 1.0),
+    "http_5xx": (2, 2.0),
+    "http_429": (3, 5.0),
+    "guard": (0, 2.0),
+}
+RETRY_MAX_DELAY = 60
+# After this many failed requests in a row a host's circuit opens: nothing is
+# sent to it for BREAKER_COOLDOWN seconds, then a single probe decides
+BREAKER_FAILURES = 5
+BREAKER_COOLDOWN = 60
+# Download workers wait out an open circuit this many times in a row before
+# leaving the rest of the queue for the next run
+BREAKER_MAX_WAITS = 5
+
+# How many subscriptions are processed at once (1 = strictly serial)
+WORKERS = 4
+
+# Tag-page scans feed one download queue shared by all subscriptions: an image
+# listed under several tags is fetched once (then copied), newer IDs go first,
+# and DOWNLOAD_WORKERS drain it while scanning is still going. The queue is
+# persisted, so a run that was killed resumes its pending downloads.
+QUEUE_DB = DEST_DIR / "_queue.sqlite3"
+DOWNLOAD_WORKERS = 4
+
+# Memory-mapped Bloom filters next to the index answer "is this ID stored
+# anywhere?" and "does this ID have a tombstone?" in memory; only a "maybe"
+# is checked against the SQLite index. Sized for BLOOM_CAPACITY IDs at
+# BLOOM_ERROR_RATE false positives, rebuilt from the index if outgrown.
+SEEN_FILTER = DEST_DIR / "_seen.bloom"
+TOMBSTONE_FILTER = DEST_DIR / "_tombstones.bloom"
+BLOOM_CAPACITY = 2_000_000
+BLOOM_ERROR_RATE = 0.001
+
+# An image that could not be fetched gets a tombstone and is not queued again
+# until it expires: "missing" when every candidate answered 403/404/410,
+# "transient" for 5xx, 429 or no answer. The wait starts at the first value
+# (seconds) and doubles with each further failure, up to the second.
+# Tombstones not refreshed for TOMBSTONE_TTL_DAYS are dropped.
+TOMBSTONE_BACKOFF = {"missing": (7 * 24 * 60 * 60, 180 * 24 * 60 * 60),
+                     "transient": (15 * 60, 24 * 60 * 60)}
+TOMBSTONE_TTL_DAYS = 365
+
+# Character folders that changed since the last run are rescanned up front,
+# this many at once (listing is I/O-bound, so it pays off on network shares)
+SCAN_WORKERS = 8
+
+# Adaptive polling: each subscription's rate of newly listed IDs (per day,
+# a time-weighted moving average with the given half-life) sets when it is
+# next due: about POLL_TARGET_NEW new images per check, bounded by the
+# min/max interval (POLL_INTERVAL until a rate is known). It also sets how
+# many tag pages a check expects to need (capped by MAX_PAGES_PER_TAG).
+# Runs and --watch only check due subscriptions (--all checks everything);
+# --schedule prints the plan. ADAPTIVE_POLLING = False checks all, always.
+ADAPTIVE_POLLING = True
+POLL_INTERVAL = 60 * 60
+POLL_MIN_INTERVAL = 10 * 60
+POLL_MAX_INTERVAL = 7 * 24 * 60 * 60
+POLL_TARGET_NEW = 5
+POLL_RATE_HALF_LIFE_DAYS = 7
+
+# Every image is stored once, as BLOB_DIR/<last two digits>/<id>.<ext>, and
+# each character folder that wants it gets a link: hardlink, else symlink,
+# else a plain copy (starting at LINK_MODE; "copy" keeps independent files).
+BLOB_DIR = DEST_DIR / "_blobs"
+LINK_MODE = "hardlink"
 
 # Debug knobs
-DEBUG = True
+DEBUG = True             # log every request, skip and parse step (otherwise progress + summary only)
+LOG_JSON = False         # one JSON object per log line, for log shipping
+LOG_FILE: Optional[Path] = None  # also append the log to this file
 SAVE_HTML_DEBUG = False  # set True to dump fetched HTML into _debug/
 DEBUG_DIR = DEST_DIR / "_debug"
-if SAVE_HTML_DEBUG:
-    DEBUG_DIR.mkdir(parents=True, exist_ok=True)
 
 # HTTP session
 HEADERS = {
@@ -39,14 +188,962 @@ HEADERS = {
     "Referer": "https://www.zerochan.net/",
     "Accept-Language": "en-US,en;q=0.9",
 }
-SESSION = requests.Session()
-SESSION.headers.update(HEADERS)
 TIMEOUT = 20
 
+# Fetch backend for tag pages and images:
+#   "requests" – one blocking requests.Session, see session() (default)
+#   "httpx"    – asyncio + HTTP/2 over pooled keep-alive connections
+#                (pip install "httpx[http2]")
+FETCH_BACKEND = "requests"
+# Max in-flight requests per host on the httpx backend
+HOST_CONCURRENCY = 4
+
+# Headless browser fallback for guard pages. One Chromium is started on first
+# use and reused for the whole run; its cookies are saved to PW_STATE_FILE so
+# the next run starts with the challenge already cleared.
+PW_STATE_FILE = DEST_DIR / "_pw_state.json"
+PW_MAX_PAGES = 2  # tabs open at the same time
+# Once the browser has passed the challenge, its cookies (cf_clearance, …) and
+# user agent are copied into SESSION so later pages stay on plain HTTP.
+# The user agent the clearance is bound to is remembered here between runs.
+PW_UA_FILE = DEST_DIR / "_pw_user_agent.txt"
+
+# Phase metrics (counts, latency histograms, bytes, error classes) are emitted
+# to every configured sink at the end of a run:
+METRICS_JSONL: Optional[Path] = None      # append one JSON object per run
+METRICS_PROM_FILE: Optional[Path] = None  # Prometheus node-exporter textfile
+# In-process consumers can subscribe with METRICS.add_sink(callback).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
 # ================== LOG ==================
-def log(msg: str):
-    if DEBUG:
-        print(msg, flush=True)
+logger = logging.getLogger("zerochan_watch")
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, thread, message (+ exception)."""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "msg": record.getMessage().strip(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
+def setup_logging() -> None:
+    """
+    Route the module logger through a queue: callers (download threads, the
+    event loops) only enqueue records, and one listener thread formats and
+    writes them. Safe to call again; the previous listener is stopped first.
+    """
+    global _log_listener
+    shutdown_logging()
+    formatter = JsonFormatter() if LOG_JSON else logging.Formatter("%(message)s")
+    handlers: List[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+    if LOG_FILE:
+        handlers.append(logging.FileHandler(LOG_FILE, encoding="utf-8"))
+    for h in handlers:
+        h.setFormatter(formatter)
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    for h in list(logger.handlers):
+        logger.removeHandler(h)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.DEBUG if DEBUG else logging.INFO)
+    logger.propagate = False
+    _log_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+
+def shutdown_logging() -> None:
+    """Flush everything still queued and close the handlers."""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        for h in _log_listener.handlers:
+            h.close()
+        _log_listener = None
+
+# ================== METRICS ==================
+class PhaseStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.errors: Dict[str, int] = {}
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # last one is +Inf
+
+    def observe(self, seconds: float, nbytes: int, error: Optional[str]) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.bytes += nbytes
+        if error:
+            self.errors[error] = self.errors.get(error, 0) + 1
+        for i, le in enumerate(LATENCY_BUCKETS):
+            if seconds <= le:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def as_dict(self) -> dict:
+        return {"count": self.count, "seconds": round(self.seconds, 6), "bytes": self.bytes,
+                "errors": dict(self.errors), "buckets": list(self.buckets)}
+
+class _PhaseTimer:
+    """Handle returned by Metrics.phase(); set .bytes / .error before the block ends."""
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+        self.bytes = 0
+        self.error: Optional[str] = None
+
+    def __enter__(self) -> "_PhaseTimer":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        error = exc_type.__name__ if exc_type else self.error
+        self.metrics.observe(self.name, time.perf_counter() - self._t0, self.bytes, error)
+        return False
+
+class Metrics:
+    """
+    Per-phase counters and latency histograms for one run, plus free-form
+    event counters. Phases: load, migrate, scan, fetch_http, fetch_browser,
+    parse, download. Thread-safe; emit() hands a snapshot to every sink.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sinks: List = []
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self.phases: Dict[str, PhaseStats] = {}
+            self.counters: Dict[str, int] = {}
+
+    def phase(self, name: str) -> _PhaseTimer:
+        return _PhaseTimer(self, name)
+
+    def observe(self, name: str, seconds: float, nbytes: int = 0, error: Optional[str] = None) -> None:
+        with self._lock:
+            stats = self.phases.get(name)
+            if stats is None:
+                stats = self.phases[name] = PhaseStats()
+            stats.observe(seconds, nbytes, error)
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "started": self.started,
+                "duration_s": round(time.time() - self.started, 3),
+                "latency_buckets": list(LATENCY_BUCKETS),
+                "phases": {name: st.as_dict() for name, st in self.phases.items()},
+                "counters": dict(self.counters),
+            }
+
+    def add_sink(self, sink) -> None:
+        """sink(snapshot: dict) is called by emit()."""
+        self._sinks.append(sink)
+
+    def remove_sink(self, sink) -> None:
+        if sink in self._sinks:
+            self._sinks.remove(sink)
+
+    def emit(self) -> None:
+        snap = self.snapshot()
+        for sink in list(self._sinks):
+            try:
+                sink(snap)
+            except Exception as e:
+                logger.warning("[METR] sink %r failed: %s", sink, e)
+
+class JsonLinesSink:
+    """Appends one JSON object per emitted snapshot."""
+    def __init__(self, path: Path):
+        self.path = path
+
+    def __call__(self, snap: dict) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(snap, separators=(",", ":")) + "\n")
+
+class PrometheusTextfileSink:
+    """Rewrites a node-exporter textfile (atomically) with the latest snapshot."""
+    def __init__(self, path: Path, prefix: str = "zerochan"):
+        self.path = path
+        self.prefix = prefix
+
+    def render(self, snap: dict) -> str:
+        p = self.prefix
+        out = [f"# TYPE {p}_phase_duration_seconds histogram"]
+        for name, st in snap["phases"].items():
+            cumulative = 0
+            for le, n in zip(list(snap["latency_buckets"]) + ["+Inf"], st["buckets"]):
+                cumulative += n
+                out.append(f'{p}_phase_duration_seconds_bucket{{phase="{name}",le="{le}"}} {cumulative}')
+            out.append(f'{p}_phase_duration_seconds_sum{{phase="{name}"}} {st["seconds"]}')
+            out.append(f'{p}_phase_duration_seconds_count{{phase="{name}"}} {st["count"]}')
+        out.append(f"# TYPE {p}_phase_bytes_total counter")
+        for name, st in snap["phases"].items():
+            out.append(f'{p}_phase_bytes_total{{phase="{name}"}} {st["bytes"]}')
+        out.append(f"# TYPE {p}_phase_errors_total counter")
+        for name, st in snap["phases"].items():
+            for error, n in st["errors"].items():
+                out.append(f'{p}_phase_errors_total{{phase="{name}",error="{error}"}} {n}')
+        out.append(f"# TYPE {p}_events_total counter")
+        for name, n in snap["counters"].items():
+            out.append(f'{p}_events_total{{event="{name}"}} {n}')
+        out.append(f"# TYPE {p}_run_duration_seconds gauge")
+        out.append(f'{p}_run_duration_seconds {snap["duration_s"]}')
+        return "\n".join(out) + "\n"
+
+    def __call__(self, snap: dict) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(self.render(snap), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+METRICS = Metrics()
+
+def configure_metrics_sinks() -> List:
+    """Attach the file sinks named in the config; returns them for later removal."""
+    sinks = []
+    if METRICS_JSONL:
+        sinks.append(JsonLinesSink(Path(METRICS_JSONL)))
+    if METRICS_PROM_FILE:
+        sinks.append(PrometheusTextfileSink(Path(METRICS_PROM_FILE)))
+    for sink in sinks:
+        METRICS.add_sink(sink)
+    return sinks
+
+# ================== POLITENESS ==================
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After as seconds from now; accepts delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+class TokenBucket:
+    def __init__(self, delay: float, burst: int):
+        self.base_delay = delay
+        self.delay = delay
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.stamp = time.monotonic()
+        self.blocked_until = 0.0
+
+    def refill(self, now: float) -> None:
+        if self.delay > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) / self.delay)
+        else:
+            self.tokens = float(self.burst)
+        self.stamp = now
+
+class RateLimiter:
+    """
+    Process-wide politeness budget: one token bucket per host.
+    acquire() blocks until the host has a token; observe() feeds responses back
+    so 429/503 (and Retry-After) slow the host down and successes ease it back.
+    """
+    def __init__(self, limits: Dict[str, Tuple[float, int]],
+                 default_delay: float, default_burst: int):
+        self.limits = dict(limits)
+        self.default_delay = default_delay
+        self.default_burst = default_burst
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def _bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc
+        b = self._buckets.get(host)
+        if b is None:
+            delay, burst = self.limits.get(host, (self.default_delay, self.default_burst))
+            b = self._buckets[host] = TokenBucket(delay, burst)
+        return b
+
+    def acquire(self, url: str) -> bool:
+        """Take a token for url's host; False if shutdown was requested while waiting."""
+        while True:
+            with self._lock:
+                b = self._bucket(url)
+                now = time.monotonic()
+                b.refill(now)
+                if now < b.blocked_until:
+                    wait = b.blocked_until - now
+                elif b.tokens >= 1:
+                    b.tokens -= 1
+                    return True
+                else:
+                    wait = (1 - b.tokens) * b.delay
+            if SHUTDOWN.wait(wait):  # a Retry-After pause can be minutes
+                return False
+
+    def observe(self, url: str, status: int, headers: Optional[Mapping[str, str]] = None) -> None:
+        with self._lock:
+            b = self._bucket(url)
+            if status in (429, 503):
+                b.delay = min(max(b.delay * 2, 1.0), max(RATE_MAX_DELAY, b.base_delay))
+                b.tokens = 0.0
+                retry_after = parse_retry_after((headers or {}).get("Retry-After"))
+                pause = min(retry_after, RETRY_AFTER_CAP) if retry_after is not None else b.delay
+                b.blocked_until = max(b.blocked_until, time.monotonic() + pause)
+                logger.warning("[RATE] %s: %d → pause %.1fs, delay now %.1fs",
+                               urlsplit(url).netloc, status, pause, b.delay)
+            elif status < 400 and b.delay > b.base_delay:
+                b.delay = max(b.base_delay, b.delay * 0.9)
+
+RATE_LIMITER = RateLimiter(RATE_LIMITS, REQUEST_DELAY, RATE_BURST)
+
+# ================== RETRY POLICY ==================
+GUARD_MARKERS = ("just a moment", "checking your browser")
+
+def is_guard_page(r: "HttpResponse") -> bool:
+    if not r.text:
+        return False
+    text_lower = r.text.lower()
+    return any(marker in text_lower for marker in GUARD_MARKERS)
+
+def classify_response(r: "HttpResponse") -> Optional[str]:
+    """RETRY_POLICY class of a response worth retrying, None for a usable answer."""
+    if is_guard_page(r):
+        return "guard"
+    if r.status_code == 429:
+        return "http_429"
+    if 500 <= r.status_code < 600:
+        return "http_5xx"
+    return None
+
+def classify_exception(e: BaseException) -> Optional[str]:
+    """
+    RETRY_POLICY class of a failed request, by exception type name so that
+    requests, urllib3 and httpx errors map alike without importing them.
+    None means it is not a network failure and is not retried.
+    """
+    chain, cur = [], e
+    while cur is not None and len(chain) < 8:
+        chain.append(cur)
+        cur = cur.__cause__ or cur.__context__
+    for exc in chain:
+        text = str(exc)
+        if (isinstance(exc, socket.gaierror) or "NameResolution" in type(exc).__name__
+                or "getaddrinfo" in text or "Name or service not known" in text
+                or "Failed to resolve" in text or "nodename nor servname" in text):
+            return "dns"
+    # outermost first: wrappers know best (urllib3's NewConnectionError, say,
+    # derives from a timeout class though the connection was refused)
+    for exc in chain:
+        names = {cls.__name__ for cls in type(exc).__mro__}
+        if "ConnectTimeout" in names:
+            return "connect_timeout"
+        if names & {"ConnectionError", "ConnectError", "NetworkError", "RemoteProtocolError",
+                    "ProtocolError", "ChunkedEncodingError", "IncompleteDownload"}:
+            return "connection"
+        if names & {"ReadTimeout", "Timeout", "TimeoutException", "TimeoutError", "timeout"}:
+            return "read_timeout"
+    return None
+
+class CircuitOpen(IOError):
+    """The host's circuit breaker is open; the request was not sent."""
+    def __init__(self, message: str, retry_in: float = 0.0, probing: bool = False):
+        super().__init__(message)
+        self.retry_in = retry_in  # seconds until the circuit lets a probe through
+        self.probing = probing    # a probe is in flight: the verdict is coming
+
+class Interrupted(IOError):
+    """Shutdown was requested while the request waited for its turn; it was not sent."""
+
+class HostCircuit:
+    def __init__(self):
+        self.failures = 0       # failed requests in a row
+        self.open_until = 0.0   # monotonic time; 0 = closed
+        self.probing = False    # half-open: one request is testing the host
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker. `threshold` failed requests in a row open the
+    circuit for `cooldown` seconds; after that one probe is let through and
+    its outcome closes the circuit or opens it again.
+    """
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, HostCircuit] = {}
+
+    def _circuit(self, url: str) -> HostCircuit:
+        host = urlsplit(url).netloc
+        c = self._hosts.get(host)
+        if c is None:
+            c = self._hosts[host] = HostCircuit()
+        return c
+
+    def allow(self, url: str) -> bool:
+        with self._lock:
+            c = self._circuit(url)
+            if not c.open_until:
+                return True
+            if time.monotonic() < c.open_until or c.probing:
+                return False
+            c.probing = True
+            return True
+
+    def success(self, url: str) -> None:
+        with self._lock:
+            c = self._circuit(url)
+            if c.open_until:
+                logger.info("[HTTP] %s answers again → circuit closed", urlsplit(url).netloc)
+            c.failures, c.open_until, c.probing = 0, 0.0, False
+
+    def retry_in(self, url: str) -> float:
+        """Seconds until url's host takes a request again (0 when it does now)."""
+        with self._lock:
+            c = self._circuit(url)
+            return max(0.0, c.open_until - time.monotonic()) if c.open_until else 0.0
+
+    def probing(self, url: str) -> bool:
+        """True while a probe is testing url's host."""
+        with self._lock:
+            return self._circuit(url).probing
+
+    def release(self, url: str) -> None:
+        """The request failed for a reason of our own: no verdict on the host."""
+        with self._lock:
+            self._circuit(url).probing = False
+
+    def failure(self, url: str) -> None:
+        with self._lock:
+            c = self._circuit(url)
+            c.failures += 1
+            if c.probing or (not c.open_until and c.failures >= self.threshold):
+                c.open_until = time.monotonic() + self.cooldown
+                c.probing = False
+                METRICS.count("breaker_trips")
+                logger.warning("[HTTP] %s: %d failed requests in a row → circuit open for %.0fs",
+                               urlsplit(url).netloc, c.failures, self.cooldown)
+
+class RetryPolicy:
+    """
+    Sends requests through the host's circuit breaker and rate limiter and
+    retries failures by RETRY_POLICY class (see classify_response and
+    classify_exception). Retries, give-ups and breaker trips are counted in
+    METRICS as retry_<class>, retry_exhausted_<class> and breaker_trips.
+    """
+    def __init__(self, policy: Dict[str, Tuple[int, float]], max_delay: float, breaker: CircuitBreaker):
+        self.policy = policy
+        self.max_delay = max_delay
+        self.breaker = breaker
+
+    def delay(self, kind: str, retry: int, headers: Optional[Mapping[str, str]] = None) -> float:
+        retry_after = parse_retry_after((headers or {}).get("Retry-After"))
+        if retry_after is not None:
+            return min(retry_after, RETRY_AFTER_CAP)
+        cap = min(self.max_delay, self.policy[kind][1] * 2 ** retry)
+        return cap / 2 + random.uniform(0, cap / 2)
+
+    def call(self, url: str, attempt: Callable[[], "HttpResponse"]) -> "HttpResponse":
+        """
+        Run attempt() (one request to url) until it gives a usable answer or
+        its failure class is out of retries; then the last response is
+        returned or the last exception raised. Raises CircuitOpen instead of
+        sending anything while url's host is cut off, and Interrupted once
+        shutdown is requested.
+        """
+        retry = 0
+        while True:
+            if not self.breaker.allow(url):
+                METRICS.count("breaker_rejected")
+                raise CircuitOpen(f"{urlsplit(url).netloc}: circuit open, not sending {url}",
+                                  self.breaker.retry_in(url), self.breaker.probing(url))
+            if not RATE_LIMITER.acquire(url):
+                self.breaker.release(url)
+                raise Interrupted(f"shutting down, not sending {url}")
+            r: Optional[HttpResponse] = None
+            error: Optional[Exception] = None
+            try:
+                r = attempt()
+                RATE_LIMITER.observe(url, r.status_code, r.headers)
+                kind = classify_response(r)
+            except Exception as e:
+                error, kind = e, classify_exception(e)
+                if kind is None:
+                    self.breaker.release(url)
+                    raise
+            if kind is None:
+                self.breaker.success(url)
+                return r
+            if kind == "guard":
+                self.breaker.release(url)  # the browser's job, not a host outage
+            else:
+                self.breaker.failure(url)
+            retries = self.policy.get(kind, (0, 0.0))[0]
+            if retry >= retries or SHUTDOWN.wait(self.delay(kind, retry, r.headers if r else None)):
+                if retries:
+                    METRICS.count(f"retry_exhausted_{kind}")
+                if error is not None:
+                    raise error
+                return r
+            retry += 1
+            METRICS.count(f"retry_{kind}")
+            logger.debug("[HTTP] %s: %s → retry %d of %d", url, kind, retry, retries)
+
+RETRY = RetryPolicy(RETRY_POLICY, RETRY_MAX_DELAY, CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN))
+
+# ================== FETCH BACKENDS ==================
+class HttpResponse(NamedTuple):
+    status_code: int
+    headers: Mapping[str, str]
+    content: bytes
+    text: str
+
+SESSION: Optional["requests.Session"] = None  # created by session() on first use
+_session_lock = threading.Lock()
+
+def session() -> "requests.Session":
+    """The shared requests session (HEADERS, cookie jar), created on first use."""
+    global SESSION
+    if SESSION is None:
+        with _session_lock:
+            if SESSION is None:
+                import requests
+                s = requests.Session()
+                s.headers.update(HEADERS)
+                SESSION = s
+    return SESSION
+
+class IncompleteDownload(IOError):
+    """The body ended before the advertised length; the .part file is kept for resuming."""
+
+def part_path(dest: Path) -> Path:
+    """Where dest is streamed to until it is complete (never matches the ID scanners)."""
+    return dest.with_name(dest.name + ".part")
+
+def _resume_request(part: Path) -> Tuple[int, Dict[str, str]]:
+    """Bytes already on disk and the request headers that continue from there."""
+    offset = part.stat().st_size if part.exists() else 0
+    # identity keeps byte offsets on disk and on the wire the same
+    headers = {"Accept-Encoding": "identity"}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+    return offset, headers
+
+def _part_mode(status: int, headers: Mapping[str, str], offset: int) -> Optional[str]:
+    """How to open the .part file for this response, or None if the body is not ours."""
+    if status == 200:
+        return "wb"  # fresh download, or the server ignored Range
+    if status == 206:
+        m = re.match(r"bytes (\d+)-", headers.get("Content-Range", ""))
+        if m and int(m.group(1)) == offset:
+            return "ab"
+    return None
+
+def _finish_part(part: Path, dest: Path, status: int, headers: Mapping[str, str], offset: int) -> int:
+    """
+    Check a streamed .part against the advertised size and move it into place.
+    Returns the status to report: 200 once dest exists, 416 when the partial
+    file is unusable (it is deleted so the next attempt starts over).
+    """
+    if status == 416 or (status == 206 and _part_mode(status, headers, offset) is None):
+        part.unlink(missing_ok=True)
+        return 416
+    if status not in (200, 206):
+        return status
+    m = re.search(r"/(\d+)$", headers.get("Content-Range", ""))
+    if m:
+        expected: Optional[int] = int(m.group(1))
+    elif headers.get("Content-Length", "").isdigit():
+        expected = int(headers["Content-Length"]) + (offset if status == 206 else 0)
+    else:
+        expected = None
+    size = part.stat().st_size
+    if expected is not None and size != expected:
+        raise IncompleteDownload(f"{part.name}: {size} of {expected} bytes")
+    os.replace(part, dest)
+    return 200
+
+class AsyncFetcher:
+    """
+    httpx.AsyncClient running on a private event-loop thread.
+    Worker threads submit coroutines and block on the result, so all of them
+    share one connection pool (HTTP/2 when `h2` is installed) and the loop
+    multiplexes their page fetches and image downloads.
+    A semaphore per host caps in-flight requests at `per_host`.
+    """
+    def __init__(self, per_host: int):
+        import asyncio
+        import httpx
+        self._asyncio = asyncio
+        self._httpx = httpx
+        self.per_host = per_host
+        self._sems: Dict[str, "asyncio.Semaphore"] = {}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        name="fetch-loop", daemon=True)
+        self._thread.start()
+        self._client = self._call(self._open_client())
+
+    async def _open_client(self):
+        http2 = importlib.util.find_spec("h2") is not None
+        if not http2:
+            logger.info("[HTTP] h2 not installed → httpx backend uses HTTP/1.1 keep-alive")
+        # share SESSION's cookie jar so browser clearance reaches this backend too
+        return self._httpx.AsyncClient(
+            http2=http2,
+            headers={**HEADERS, "User-Agent": session().headers["User-Agent"]},
+            cookies=session().cookies,
+            timeout=TIMEOUT,
+            follow_redirects=True,
+            limits=self._httpx.Limits(max_keepalive_connections=self.per_host * 4),
+        )
+
+    def _call(self, coro):
+        return self._asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def _sem(self, url: str) -> "asyncio.Semaphore":
+        # only touched from the loop thread, so no lock needed
+        host = urlsplit(url).netloc
+        sem = self._sems.get(host)
+        if sem is None:
+            sem = self._sems[host] = self._asyncio.Semaphore(self.per_host)
+        return sem
+
+    async def _get(self, url: str, headers: Optional[Mapping[str, str]]) -> HttpResponse:
+        async with self._sem(url):
+            r = await self._client.get(url, headers=headers)
+            return HttpResponse(r.status_code, r.headers, r.content, r.text)
+
+    async def _download(self, url: str, dest: Path) -> HttpResponse:
+        part = part_path(dest)
+        offset, headers = _resume_request(part)
+        async with self._sem(url):
+            async with self._client.stream("GET", url, headers=headers) as r:
+                mode = _part_mode(r.status_code, r.headers, offset)
+                if mode:
+                    with open(part, mode) as f:
+                        async for chunk in r.aiter_bytes(65536):
+                            f.write(chunk)
+                status = _finish_part(part, dest, r.status_code, r.headers, offset)
+                return HttpResponse(status, r.headers, b"", "")
+
+    def get(self, url: str, headers: Optional[Mapping[str, str]] = None) -> HttpResponse:
+        return self._call(self._get(url, headers))
+
+    def set_user_agent(self, user_agent: str) -> None:
+        self._loop.call_soon_threadsafe(self._client.headers.__setitem__, "User-Agent", user_agent)
+
+    def download(self, url: str, dest: Path) -> HttpResponse:
+        return self._call(self._download(url, dest))
+
+    def close(self) -> None:
+        self._call(self._client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+_fetcher: Optional[AsyncFetcher] = None
+_fetcher_lock = threading.Lock()
+
+def _async_fetcher() -> AsyncFetcher:
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = AsyncFetcher(HOST_CONCURRENCY)
+        return _fetcher
+
+def close_fetcher() -> None:
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is not None:
+            _fetcher.close()
+            _fetcher = None
+
+def http_get(url: str, headers: Optional[Mapping[str, str]] = None) -> HttpResponse:
+    """One GET on the configured backend, fully read. headers are added to the defaults."""
+    if FETCH_BACKEND == "httpx":
+        return _async_fetcher().get(url, headers)
+    r = session().get(url, headers=headers, timeout=TIMEOUT)
+    return HttpResponse(r.status_code, r.headers, r.content, r.text)
+
+def _download_once(url: str, dest: Path) -> HttpResponse:
+    if FETCH_BACKEND == "httpx":
+        return _async_fetcher().download(url, dest)
+    part = part_path(dest)
+    offset, headers = _resume_request(part)
+    with session().get(url, headers=headers, stream=True, timeout=TIMEOUT) as r:
+        mode = _part_mode(r.status_code, r.headers, offset)
+        if mode:
+            with open(part, mode) as f:
+                for chunk in r.iter_content(chunk_size=65536):
+                    if chunk:
+                        f.write(chunk)
+        status = _finish_part(part, dest, r.status_code, r.headers, offset)
+        return HttpResponse(status, r.headers, b"", "")
+
+def http_download(url: str, dest: Path) -> HttpResponse:
+    """
+    Stream url into dest on the configured backend, resumably: bytes go to
+    dest + ".part" and the file is renamed into place only when complete.
+    A leftover .part from an interrupted transfer is continued with a Range
+    request (or restarted if the server answers 200). Status 200 means dest
+    exists; the response carries the headers with an empty body.
+    """
+    r = _download_once(url, dest)
+    if r.status_code == 416:
+        logger.debug("    [DL ] stale partial file for %s → starting over", dest.name)
+        r = _download_once(url, dest)
+    return r
+
+# ================== BROWSER POOL ==================
+class BrowserPage(NamedTuple):
+    html: str
+    cookies: List[dict]
+    user_agent: str
+
+class BrowserPool:
+    """
+    Long-lived headless Chromium on a private event-loop thread.
+    Started lazily by the first fetch(); every later URL reuses the same
+    browser and context, each in a fresh tab, with at most `max_pages` tabs
+    open at once. The context's storage_state (cookies, localStorage) is
+    loaded from and saved to `state_file`.
+    """
+    def __init__(self, state_file: Path, max_pages: int):
+        import asyncio
+        self._asyncio = asyncio
+        self.state_file = state_file
+        self.max_pages = max(1, max_pages)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        name="browser-loop", daemon=True)
+        self._thread.start()
+        self._start_lock = threading.Lock()
+        self._started = False
+        self._broken = False
+        self._pw = self._browser = self._context = None
+        self._sem: Optional["asyncio.Semaphore"] = None
+
+    def _call(self, coro):
+        return self._asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _start(self) -> None:
+        logger.info("[PW] Launching headless Chromium (reused for this run)")
+        from playwright.async_api import async_playwright
+        self._pw = await async_playwright().start()
+        self._browser = await self._pw.chromium.launch(headless=True)
+        kwargs = {}
+        if self.state_file.exists():
+            logger.debug("[PW] Restoring browser state from %s", self.state_file.name)
+            kwargs["storage_state"] = str(self.state_file)
+        self._context = await self._browser.new_context(**kwargs)
+        await self._context.set_extra_http_headers({"Referer": HEADERS["Referer"]})
+        self._sem = self._asyncio.Semaphore(self.max_pages)
+
+    def _ensure_started(self) -> bool:
+        with self._start_lock:
+            if not self._started and not self._broken:
+                try:
+                    self._call(self._start())
+                    self._started = True
+                except Exception as e:
+                    # don't pay a failing launch again for every URL
+                    logger.error("[PW] Browser unavailable: %s", e)
+                    self._broken = True
+                    try:
+                        self._call(self._shutdown())
+                    except Exception:
+                        pass
+            return self._started
+
+    async def _fetch(self, url: str) -> str:
+        async with self._sem:
+            page = await self._context.new_page()
+            try:
+                # Go and wait a bit for DOM to populate:
+                await page.goto(url, wait_until="domcontentloaded", timeout=30000)
+                # Wait for thumbs container (best-effort, don’t hang forever)
+                try:
+                    await page.wait_for_selector("ul#thumbs2, ul#thumbs3, ul[id^=thumbs]", timeout=15000)
+                except Exception:
+                    pass
+                html = await page.content()
+                user_agent = await page.evaluate("navigator.userAgent")
+            finally:
+                await page.close()
+        cookies = await self._context.cookies()
+        await self._save_state()
+        return BrowserPage(html, cookies, user_agent)
+
+    async def _save_state(self) -> None:
+        try:
+            await self._context.storage_state(path=str(self.state_file))
+        except Exception as e:
+            logger.warning("[PW] Could not save browser state: %s", e)
+
+    def fetch(self, url: str) -> Optional[BrowserPage]:
+        """Rendered page plus the context's cookies, or None if the browser failed."""
+        if not self._ensure_started():
+            return None
+        try:
+            return self._call(self._fetch(url))
+        except Exception as e:
+            logger.warning("[PW] Error: %s", e)
+            return None
+
+    async def _shutdown(self) -> None:
+        if self._context is not None:
+            await self._save_state()
+            await self._context.close()
+        if self._browser is not None:
+            await self._browser.close()
+        if self._pw is not None:
+            await self._pw.stop()
+
+    def close(self) -> None:
+        if self._started:
+            try:
+                self._call(self._shutdown())
+            except Exception as e:
+                logger.warning("[PW] Shutdown error: %s", e)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+_browser: Optional[BrowserPool] = None
+_browser_lock = threading.Lock()
+
+def _browser_pool() -> BrowserPool:
+    global _browser
+    with _browser_lock:
+        if _browser is None:
+            _browser = BrowserPool(PW_STATE_FILE, PW_MAX_PAGES)
+        return _browser
+
+def close_browser_pool() -> None:
+    global _browser
+    with _browser_lock:
+        if _browser is not None:
+            _browser.close()
+            _browser = None
+
+# ================== CLEARANCE BRIDGE ==================
+class PagePathStats:
+    """How tag pages were served: plain HTTP (hit) or the browser fallback (miss)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.http_hits = 0
+            self.browser_misses = 0
+
+    def hit(self) -> None:
+        with self._lock:
+            self.http_hits += 1
+
+    def miss(self) -> None:
+        with self._lock:
+            self.browser_misses += 1
+
+PAGE_PATH = PagePathStats()
+
+def _set_session_cookies(cookies: List[dict]) -> None:
+    for c in cookies:
+        expires = c.get("expires", -1)
+        session().cookies.set(
+            c["name"], c["value"],
+            domain=c.get("domain", ""), path=c.get("path", "/"),
+            secure=c.get("secure", False),
+            expires=int(expires) if expires and expires > 0 else None,
+        )
+
+def _set_session_user_agent(user_agent: str) -> None:
+    session().headers["User-Agent"] = user_agent
+    with _fetcher_lock:
+        if _fetcher is not None:
+            _fetcher.set_user_agent(user_agent)
+
+def share_browser_clearance(page: BrowserPage) -> None:
+    """Copy the browser's cookies and user agent into SESSION (and the httpx backend)."""
+    _set_session_cookies(page.cookies)
+    if page.user_agent and page.user_agent != session().headers.get("User-Agent"):
+        _set_session_user_agent(page.user_agent)
+        try:
+            PW_UA_FILE.write_text(page.user_agent, encoding="utf-8")
+        except OSError as e:
+            logger.warning("[PW] Could not save user agent: %s", e)
+    logger.debug("[PW] Shared %d browser cookies with the HTTP session", len(page.cookies))
+
+def load_browser_clearance() -> None:
+    """Seed SESSION with the cookies and user agent an earlier run's browser left behind."""
+    if not PW_STATE_FILE.exists():
+        return
+    try:
+        state = json.loads(PW_STATE_FILE.read_text(encoding="utf-8"))
+        cookies = [c for c in state.get("cookies", [])
+                   if c.get("expires", -1) <= 0 or c["expires"] > time.time()]
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("[PW] Ignoring unreadable browser state: %s", e)
+        return
+    _set_session_cookies(cookies)
+    if PW_UA_FILE.exists():
+        _set_session_user_agent(PW_UA_FILE.read_text(encoding="utf-8").strip())
+    logger.debug("[PW] Loaded %d saved browser cookies into the HTTP session", len(cookies))
+
+# ================== ID SETS ==================
+class IdSet:
+    """
+    Immutable set of image IDs stored as a sorted array('Q') of unique ints:
+    8 bytes per ID instead of a str object plus a hash slot, numeric order
+    for free (iteration yields ints, ascending), membership by binary search.
+    Accepts ints or digit strings wherever an ID is expected.
+    """
+    __slots__ = ("_ids",)
+
+    def __init__(self, ids: Iterable[Union[int, str]] = ()):
+        self._ids = array("Q", sorted(set(map(int, ids))))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._ids)
+
+    def __contains__(self, img_id: Union[int, str]) -> bool:
+        n = int(img_id)
+        i = bisect_left(self._ids, n)
+        return i < len(self._ids) and self._ids[i] == n
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, IdSet) and self._ids == other._ids
+
+    def __repr__(self) -> str:
+        return f"IdSet({len(self._ids)} ids)"
+
+    def max(self) -> Optional[int]:
+        return self._ids[-1] if self._ids else None
+
+    def count_above(self, img_id: int) -> int:
+        return len(self._ids) - bisect_right(self._ids, img_id)
+
+    def difference(self, other: "IdSet") -> "IdSet":
+        """IDs in self but not in other, still sorted (one binary search per ID)."""
+        out = IdSet()
+        out._ids = array("Q", (n for n in self._ids if n not in other))
+        return out
 
 # ================== HELPERS ==================
 _illegal = r'[<>:"/\\|?*]'
@@ -71,32 +1168,26 @@ def folder_name_from_subscription(sub_plus: str) -> str:
         s = s + " _"
     return s or "Unnamed"
 
-def get_soup_via_playwright(url: str) -> Optional[BeautifulSoup]:
-    log(f"[PW] Launching headless to fetch: {url}")
-    try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            # persist a profile to keep cookies across runs (optional):
-            # context = browser.new_context(storage_state="pw_state.json")
-            context = browser.new_context()
-            page = context.new_page()
-            page.set_extra_http_headers({"Referer": "https://www.zerochan.net/"})
-
-            # Go and wait a bit for DOM to populate:
-            page.goto(url, wait_until="domcontentloaded", timeout=30000)
-            # Wait for thumbs container (best-effort, don’t hang forever)
-            try:
-                page.wait_for_selector("ul#thumbs2, ul#thumbs3, ul[id^=thumbs]", timeout=15000)
-            except Exception:
-                pass
-
-            html = page.content()
-            context.close()
-            browser.close()
-            return BeautifulSoup(html, "lxml")
-    except Exception as e:
-        log(f"[PW] Error: {e}")
+def get_html_via_playwright(url: str) -> Optional[str]:
+    logger.debug("[PW] Fetching via headless browser: %s", url)
+    if not RATE_LIMITER.acquire(url):
+        return None
+    PAGE_PATH.miss()
+    with METRICS.phase("fetch_browser") as m:
+        page = _browser_pool().fetch(url)
+        if page is None:
+            m.error = "browser_failed"
+            return None
+        m.bytes = len(page.html)
+    share_browser_clearance(page)
+    return page.html
+
+def get_soup_via_playwright(url: str) -> Optional["BeautifulSoup"]:
+    html = get_html_via_playwright(url)
+    if html is None:
         return None
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, "lxml")
 
 # ---------- Preflight migration from root to per-character folders ----------
 
@@ -112,25 +1203,21 @@ def migrate_root_files_to_char_folders(root_dir: Path, subs: List[str]) -> None:
     # map charDots -> subscription "+ form"
     dots_to_sub = { sub.replace("+", ".").lower(): sub for sub in subs }
 
-    rx_pair   = re.compile(r"^(?P<char>.+?)_(?P<id>\d+)\.(?P<ext>jpg|jpeg|png)$", re.IGNORECASE)
-    rx_static = re.compile(r"^(?P<char>.+?)\.full\.(?P<id>\d+)\.(?P<ext>jpg|jpeg|png)$", re.IGNORECASE)
+    # name first, then the dirent type: entries that can't match cost no stat
+    with os.scandir(root_dir) as it:
+        candidates = [(Path(e.path), m) for e in it
+                      for m in [_rx_root_pair.match(e.name) or _rx_root_static.match(e.name)]
+                      if m and e.is_file()]
 
     moved = 0
-    for p in list(root_dir.iterdir()):
-        if not p.is_file():
-            continue
-
-        m = rx_pair.match(p.name) or rx_static.match(p.name)
-        if not m:
-            continue
-
+    for p, m in candidates:
         char_dots = m.group("char")
         img_id    = m.group("id")
         ext       = "." + m.group("ext").lower().replace("jpeg","jpg")
 
         sub = dots_to_sub.get(char_dots.lower())
         if not sub:
-            log(f"  [MIGR] skip (unknown char for this filename): {p.name}")
+            logger.debug("  [MIGR] skip (unknown char for this filename): %s", p.name)
             continue
 
         # Destination folder and filename
@@ -138,47 +1225,877 @@ def migrate_root_files_to_char_folders(root_dir: Path, subs: List[str]) -> None:
         char_folder.mkdir(parents=True, exist_ok=True)
         dest = char_folder / f"{char_dots}_{img_id}{ext}"
 
-        if dest.exists():
-            log(f"  [MIGR] duplicate exists, removing source: {p.name}")
+        blob = blob_path(img_id, ext)
+        if dest.exists() or blob.exists():
+            logger.debug("  [MIGR] duplicate exists, removing source: %s", p.name)
             try:
                 p.unlink()  # remove the extra copy in root
             except Exception as e:
-                log(f"  [MIGR] could not remove duplicate: {e}")
+                logger.warning("  [MIGR] could not remove duplicate: %s", e)
+            if not dest.exists():
+                link_file(blob, dest)
             continue
 
+        # Into the blob store, then linked from the character folder
         try:
-            shutil.move(str(p), str(dest))
-            log(f"  [MIGR] moved → {char_folder.name}\\{dest.name}")
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(p), str(blob))
+            link_file(blob, dest)
+            logger.debug("  [MIGR] moved → %s\\%s", char_folder.name, dest.name)
             moved += 1
         except Exception as e:
-            log(f"  [MIGR] move failed for {p.name}: {e}")
+            logger.warning("  [MIGR] move failed for %s: %s", p.name, e)
+
+    logger.info("[MIGR] total moved: %d", moved)
+
+
+LINK_MODES = ("hardlink", "symlink", "copy")
+
+def blob_path(img_id: str, ext: str) -> Path:
+    return BLOB_DIR / img_id[-2:].rjust(2, "0") / f"{img_id}{ext}"
+
+def find_blob(img_id: str) -> Optional[Path]:
+    for ext in (".jpg", ".png"):
+        path = blob_path(img_id, ext)
+        if path.is_file():
+            return path
+    return None
 
-    log(f"[MIGR] total moved: {moved}")
+def iter_blob_ids() -> Iterator[str]:
+    """IDs of every image in the blob store (one directory listing per bucket)."""
+    try:
+        buckets = [e.path for e in os.scandir(BLOB_DIR) if e.is_dir()]
+    except FileNotFoundError:
+        return
+    for bucket in buckets:
+        with os.scandir(bucket) as entries:
+            for entry in entries:
+                stem, ext = os.path.splitext(entry.name)
+                if stem.isdigit() and ext.lower() in (".jpg", ".png"):
+                    yield stem
 
+def adopt_blob(path: Path, img_id: str) -> Path:
+    """
+    Hardlink a file that predates the blob store into it, so later links share
+    it. Returns the blob, or path itself when it cannot be linked.
+    """
+    blob = blob_path(img_id, path.suffix.lower())
+    if blob.exists():
+        return blob
+    try:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        os.link(path, blob)
+        return blob
+    except OSError:
+        return path
 
-def build_existing_ids_for_char(char_folder: Path) -> Set[str]:
+def link_file(src: Path, dest: Path) -> str:
+    """
+    Make dest show src's content: the first of LINK_MODES (from LINK_MODE on)
+    the filesystem allows. Returns the mode used.
     """
-    Scan a character's folder for IDs. Accepts either:
+    modes = LINK_MODES[LINK_MODES.index(LINK_MODE):] if LINK_MODE in LINK_MODES else LINK_MODES
+    for mode in modes:
+        try:
+            if mode == "hardlink":
+                os.link(src, dest)
+            elif mode == "symlink":
+                os.symlink(src.resolve(), dest)
+            else:
+                shutil.copy2(src, dest)
+            return mode
+        except (OSError, NotImplementedError) as e:
+            if mode == "copy":
+                raise
+            logger.debug("    [LINK] %s failed for %s: %s", mode, dest.name, e)
+    raise OSError(f"no link mode left for {dest}")
+
+# filename patterns, compiled once: character folders, then loose files in the root
+_rx_name_pair   = re.compile(r"^.+?_(\d+)\.(?:jpg|jpeg|png)$", re.IGNORECASE)
+_rx_name_id     = re.compile(r"^(\d+)\.(?:jpg|jpeg|png)$", re.IGNORECASE)
+_rx_root_pair   = re.compile(r"^(?P<char>.+?)_(?P<id>\d+)\.(?P<ext>jpg|jpeg|png)$", re.IGNORECASE)
+_rx_root_static = re.compile(r"^(?P<char>.+?)\.full\.(?P<id>\d+)\.(?P<ext>jpg|jpeg|png)$", re.IGNORECASE)
+
+def scan_char_folder(char_folder: Path) -> List[Tuple[str, str, int, float]]:
+    """
+    Scan a character's folder for image files. Accepts either:
       <charDots>_<id>.jpg  OR  <id>.jpg
-    Returns set of string IDs.
+    Hardlinks and symlinks into the blob store count like any file; a
+    symlink whose blob is gone does not. Unfinished downloads (*.jpg.part)
+    never match.
+    Uses os.scandir: names are matched first and the file check comes from
+    the directory entry, so only matching files are stat()ed, and only
+    for their size/mtime.
+    Returns (id, filename, size, mtime) per matching file.
     """
-    ids: Set[str] = set()
-    rx_pair = re.compile(r"^.+?_(\d+)\.(?:jpg|jpeg|png)$", re.IGNORECASE)
-    rx_id   = re.compile(r"^(\d+)\.(?:jpg|jpeg|png)$", re.IGNORECASE)
-    if not char_folder.exists():
-        return ids
-    for p in char_folder.iterdir():
-        if not p.is_file(): 
+    found: List[Tuple[str, str, int, float]] = []
+    try:
+        it = os.scandir(char_folder)
+    except FileNotFoundError:
+        return found
+    with it:
+        for entry in it:
+            m = _rx_name_pair.match(entry.name) or _rx_name_id.match(entry.name)
+            if not m:
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+                found.append((m.group(1), entry.name, st.st_size, st.st_mtime))
+            except OSError:
+                continue  # vanished while listing
+    return found
+
+def scan_library(folders: Mapping[str, Path],
+                 workers: int = 0) -> Dict[str, List[Tuple[str, str, int, float]]]:
+    """
+    scan_char_folder() over many folders at once (key -> folder), on a
+    thread pool: directory listing waits on the disk or the network share,
+    not on the GIL. Returns key -> that folder's entries.
+    """
+    if not folders:
+        return {}
+    workers = max(1, min(workers or SCAN_WORKERS, len(folders)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan") as pool:
+        results = pool.map(scan_char_folder, folders.values())
+        return dict(zip(folders.keys(), results))
+
+# ================== ID FILTERS ==================
+class BloomFilter:
+    """
+    Bloom filter over image IDs in a memory-mapped file: opening it reads
+    only a small header, lookups touch a few pages of the bit array, and
+    the OS writes added bits back. False positives happen (about the
+    configured rate while under capacity), false negatives do not.
+    add() is serialized; lookups need no lock.
+    """
+    MAGIC = b"ZWBLOOM1"
+    HEADER = struct.Struct("<8sQQQ")  # magic, bits, hashes, IDs added
+
+    def __init__(self, path: Path, capacity: int, error_rate: float):
+        self.path = path
+        self._lock = threading.Lock()
+        self.fresh = False  # True when the file was (re)created and needs seeding
+        header = self._read_header()
+        if header is None:
+            self._create(*self._geometry(capacity, error_rate))
+        elif header[3] > max(capacity, self._capacity(header[1], error_rate)):
+            # outgrown: start over at least twice as large
+            logger.info("[IDX ] %s outgrew its capacity, rebuilding", path.name)
+            self._create(*self._geometry(max(capacity, 2 * header[3]), error_rate))
+        self._file = open(path, "r+b")
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        _, self.bits, self.hashes, self.count = self.HEADER.unpack_from(self._mm, 0)
+
+    @staticmethod
+    def _geometry(capacity: int, error_rate: float) -> Tuple[int, int]:
+        bits = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        return bits, max(1, round(bits / capacity * math.log(2)))
+
+    @staticmethod
+    def _capacity(bits: int, error_rate: float) -> int:
+        return int(bits * math.log(2) ** 2 / -math.log(error_rate))
+
+    def _read_header(self) -> Optional[Tuple[bytes, int, int, int]]:
+        try:
+            with open(self.path, "rb") as f:
+                header = self.HEADER.unpack(f.read(self.HEADER.size))
+        except (OSError, struct.error):
+            return None
+        size = self.path.stat().st_size
+        if header[0] != self.MAGIC or size != self.HEADER.size + (header[1] + 7) // 8:
+            return None
+        return header
+
+    def _create(self, bits: int, hashes: int) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, bits, hashes, 0))
+            f.truncate(self.HEADER.size + (bits + 7) // 8)  # sparse zeroes
+        os.replace(tmp, self.path)
+        self.fresh = True
+
+    def _positions(self, img_id: Union[int, str]) -> Iterator[int]:
+        digest = hashlib.blake2b(int(img_id).to_bytes(8, "little"), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def __contains__(self, img_id: Union[int, str]) -> bool:
+        mm, base = self._mm, self.HEADER.size
+        return all(mm[base + (p >> 3)] & (1 << (p & 7)) for p in self._positions(img_id))
+
+    def add(self, img_id: Union[int, str]) -> None:
+        mm, base = self._mm, self.HEADER.size
+        with self._lock:
+            new = False
+            for p in self._positions(img_id):
+                i, bit = base + (p >> 3), 1 << (p & 7)
+                if not mm[i] & bit:
+                    mm[i] |= bit
+                    new = True
+            if new:
+                self.count += 1
+                self.HEADER.pack_into(mm, 0, self.MAGIC, self.bits, self.hashes, self.count)
+
+    def close(self) -> None:
+        with self._lock:
+            self._mm.flush()
+            self._mm.close()
+            self._file.close()
+
+# ================== STATE INDEX ==================
+def sha1_file(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class StateIndex:
+    """
+    On-disk index of downloaded IDs per subscription (SQLite in WAL mode).
+    A folder is trusted as long as its mtime matches the one recorded at the
+    last scan; our own downloads update both the rows and that mtime, so a
+    steady-state run never lists the folders at all.
+    With filter paths, Bloom filters of every stored and every tombstoned
+    ID answer most "do we have it?" questions without a query.
+    Safe to share between worker threads.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS files (
+        sub    TEXT NOT NULL,
+        img_id TEXT NOT NULL,
+        name   TEXT NOT NULL,
+        size   INTEGER,
+        mtime  REAL,
+        sha1   TEXT,
+        PRIMARY KEY (sub, img_id)
+    );
+    CREATE TABLE IF NOT EXISTS folders (
+        sub        TEXT PRIMARY KEY,
+        mtime_ns   INTEGER NOT NULL,
+        scanned_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS subs (
+        sub        TEXT PRIMARY KEY,
+        high_water INTEGER NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS backfills (
+        sub        TEXT PRIMARY KEY,
+        started_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS schedule (
+        sub        TEXT PRIMARY KEY,
+        rate       REAL,
+        last_check REAL,
+        next_check REAL NOT NULL,
+        depth      INTEGER NOT NULL,
+        page_size  INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS tombstones (
+        img_id       TEXT PRIMARY KEY,
+        sub          TEXT NOT NULL,
+        kind         TEXT NOT NULL,
+        status       INTEGER NOT NULL,
+        failures     INTEGER NOT NULL,
+        first_failed REAL NOT NULL,
+        last_failed  REAL NOT NULL,
+        retry_at     REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS tombstones_sub ON tombstones (sub, retry_at);
+    """
+
+    def __init__(self, path: Path, seen_filter: Optional[Path] = None,
+                 tombstone_filter: Optional[Path] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+        self._seen = self._open_filter(seen_filter, self._seen_ids)
+        self._tombs = self._open_filter(tombstone_filter, self._tombstone_ids)
+
+    def _open_filter(self, path: Optional[Path], seed: Callable[[], Iterable[str]]) -> Optional[BloomFilter]:
+        if path is None:
+            return None
+        bloom = BloomFilter(path, BLOOM_CAPACITY, BLOOM_ERROR_RATE)
+        if bloom.fresh:
+            # new or rebuilt: fill it from the exact records it stands in for
+            n = 0
+            for img_id in seed():
+                bloom.add(img_id)
+                n += 1
+            logger.info("[IDX ] built %s from %d ID(s)", path.name, n)
+        return bloom
+
+    def _seen_ids(self) -> Iterator[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT DISTINCT img_id FROM files").fetchall()
+        yield from (r[0] for r in rows)
+        yield from iter_blob_ids()
+
+    def _tombstone_ids(self) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._db.execute("SELECT img_id FROM tombstones")]
+
+    def close(self) -> None:
+        for bloom in (self._seen, self._tombs):
+            if bloom is not None:
+                bloom.close()
+        with self._lock:
+            self._db.close()
+
+    def _folder_mtime(self, char_folder: Path) -> int:
+        return char_folder.stat().st_mtime_ns
+
+    def existing_ids(self, sub: str, char_folder: Path, rescan: bool = False) -> IdSet:
+        """IDs stored for sub; rescans the folder only if forced or its mtime moved."""
+        mtime_ns = self._folder_mtime(char_folder)
+        with self._lock:
+            row = self._db.execute("SELECT mtime_ns FROM folders WHERE sub = ?", (sub,)).fetchone()
+            if not rescan and row and row[0] == mtime_ns:
+                rows = self._db.execute("SELECT img_id FROM files WHERE sub = ?", (sub,))
+                return IdSet(r[0] for r in rows)
+
+        logger.debug("  [IDX ] rescanning %s (%s)", char_folder.name, "forced" if rescan else "folder changed")
+        found = scan_char_folder(char_folder)
+        self._store_scan(sub, found, mtime_ns)
+        return IdSet(img_id for img_id, _, _, _ in found)
+
+    def refresh_library(self, subs: List[str], rescan: bool = False) -> int:
+        """
+        Bring every subscription's rows up to date in one parallel pass
+        (scan_library), rescanning only folders whose mtime moved, or all of
+        them with rescan. Returns how many folders were rescanned.
+        """
+        with self._lock:
+            stamps = dict(self._db.execute("SELECT sub, mtime_ns FROM folders"))
+        stale: Dict[str, Path] = {}
+        mtimes: Dict[str, int] = {}
+        for sub in subs:
+            folder = DEST_DIR / folder_name_from_subscription(sub)
+            try:
+                mtimes[sub] = self._folder_mtime(folder)
+            except FileNotFoundError:
+                continue  # created (empty) when the subscription is processed
+            if rescan or stamps.get(sub) != mtimes[sub]:
+                stale[sub] = folder
+        if stale:
+            logger.info("[IDX ] rescanning %d changed folder(s)", len(stale))
+        for sub, found in scan_library(stale).items():
+            self._store_scan(sub, found, mtimes[sub])
+        return len(stale)
+
+    def _store_scan(self, sub: str, found: List[Tuple[str, str, int, float]], mtime_ns: int) -> None:
+        with self._lock:
+            known = {r[0]: r[1:] for r in self._db.execute(
+                "SELECT name, size, mtime, sha1 FROM files WHERE sub = ?", (sub,))}
+            self._db.execute("BEGIN")
+            self._db.execute("DELETE FROM files WHERE sub = ?", (sub,))
+            for img_id, name, size, mtime in found:
+                # keep a previously computed hash if the file is unchanged
+                prev = known.get(name)
+                sha1 = prev[2] if prev and prev[0] == size and prev[1] == mtime else None
+                self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                                 (sub, img_id, name, size, mtime, sha1))
+            self._db.execute("INSERT OR REPLACE INTO folders VALUES (?, ?, ?)",
+                             (sub, mtime_ns, time.time()))
+            self._db.execute("COMMIT")
+        for img_id, _, _, _ in found:
+            self.add_seen(img_id)
+
+    def record(self, sub: str, img_id: str, path: Path, sha1: Optional[str] = None) -> None:
+        """Add one file we just wrote (or found) and re-stamp its folder."""
+        st = path.stat()
+        mtime_ns = self._folder_mtime(path.parent)
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                             (sub, img_id, path.name, st.st_size, st.st_mtime, sha1))
+            self._db.execute("UPDATE folders SET mtime_ns = ? WHERE sub = ?", (mtime_ns, sub))
+            self._db.execute("COMMIT")
+        self.add_seen(img_id)
+
+    def might_have(self, img_id: str) -> bool:
+        """False only if img_id is certainly stored nowhere (no blob, no folder copy)."""
+        return self._seen is None or img_id in self._seen
+
+    def add_seen(self, img_id: str) -> None:
+        if self._seen is not None:
+            self._seen.add(img_id)
+
+    def add_tombstone(self, img_id: str, sub: str, kind: str, status: int) -> "Tombstone":
+        """
+        Record a failed fetch of img_id. Repeated failures of the same kind
+        back off exponentially; a change of kind starts that kind's backoff over.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            row = self._db.execute("SELECT * FROM tombstones WHERE img_id = ?", (img_id,)).fetchone()
+            prev = Tombstone(*row) if row else None
+            failures = prev.failures + 1 if prev and prev.kind == kind else 1
+            tomb = Tombstone(img_id, sub, kind, status, failures, prev.first_failed if prev else now,
+                             now, now + tombstone_delay(kind, failures))
+            self._db.execute("INSERT OR REPLACE INTO tombstones VALUES (?, ?, ?, ?, ?, ?, ?, ?)", tomb)
+            self._db.execute("COMMIT")
+        if self._tombs is not None:
+            self._tombs.add(img_id)
+        return tomb
+
+    def clear_tombstone(self, img_id: str) -> None:
+        if self._tombs is not None and img_id not in self._tombs:
+            return
+        with self._lock:
+            self._db.execute("DELETE FROM tombstones WHERE img_id = ?", (img_id,))
+
+    def tombstoned(self, img_id: str, now: float) -> bool:
+        """True while img_id has a tombstone that has not expired yet."""
+        if self._tombs is not None and img_id not in self._tombs:
+            return False
+        with self._lock:
+            row = self._db.execute("SELECT retry_at FROM tombstones WHERE img_id = ?", (img_id,)).fetchone()
+        return row is not None and row[0] > now
+
+    def expired_tombstones(self, sub: str, now: float) -> List["Tombstone"]:
+        """sub's tombstones that are due for another try."""
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM tombstones WHERE sub = ? AND retry_at <= ?",
+                                    (sub, now)).fetchall()
+        return [Tombstone(*row) for row in rows]
+
+    def tombstones(self, kind: Optional[str] = None) -> List["Tombstone"]:
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM tombstones WHERE ? IS NULL OR kind = ? "
+                                    "ORDER BY retry_at", (kind, kind)).fetchall()
+        return [Tombstone(*row) for row in rows]
+
+    def clear_tombstones(self, img_ids: Iterable[str] = (), kind: Optional[str] = None) -> int:
+        """Drop the given IDs' tombstones, or every one of kind (all of them when neither is given)."""
+        img_ids = list(img_ids)
+        with self._lock:
+            if img_ids:
+                return self._db.executemany("DELETE FROM tombstones WHERE img_id = ?",
+                                            [(i,) for i in img_ids]).rowcount
+            return self._db.execute("DELETE FROM tombstones WHERE ? IS NULL OR kind = ?",
+                                    (kind, kind)).rowcount
+
+    def evict_tombstones(self, ttl_days: float) -> int:
+        """Drop tombstones whose last failure is older than ttl_days."""
+        with self._lock:
+            return self._db.execute("DELETE FROM tombstones WHERE last_failed < ?",
+                                    (time.time() - ttl_days * 86400,)).rowcount
+
+    def likely_ext(self, sub: str) -> str:
+        """Extension to try first for sub's images, judged by the files already stored."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT count(*), sum(lower(name) LIKE '%.png') FROM files WHERE sub = ?",
+                (sub,)).fetchone()
+        total, png = row[0], row[1] or 0
+        return ".png" if total >= EXT_PRIOR_MIN_FILES and 2 * png > total else ".jpg"
+
+    def find(self, img_id: str) -> Optional[Path]:
+        """A stored copy of img_id in any subscription's folder, if one is still on disk."""
+        with self._lock:
+            rows = self._db.execute("SELECT sub, name FROM files WHERE img_id = ?", (img_id,)).fetchall()
+        for sub, name in rows:
+            path = DEST_DIR / folder_name_from_subscription(sub) / name
+            if path.is_file():
+                return path
+        return None
+
+    def high_water(self, sub: str) -> Optional[int]:
+        """Newest ID seen on sub's tag pages by a finished pass, if any."""
+        with self._lock:
+            row = self._db.execute("SELECT high_water FROM subs WHERE sub = ?", (sub,)).fetchone()
+        return row[0] if row else None
+
+    def set_high_water(self, sub: str, img_id: int) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO subs VALUES (?, ?, ?) ON CONFLICT(sub) DO UPDATE SET "
+                "high_water = max(high_water, excluded.high_water), updated_at = excluded.updated_at",
+                (sub, img_id, time.time()))
+
+    def backfill_pending(self, sub: str) -> bool:
+        """True while a deep walk of sub has been started but not finished."""
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM backfills WHERE sub = ?", (sub,)).fetchone() is not None
+
+    def set_backfill_pending(self, sub: str, pending: bool) -> None:
+        with self._lock:
+            if pending:
+                self._db.execute("INSERT OR IGNORE INTO backfills VALUES (?, ?)", (sub, time.time()))
+            else:
+                self._db.execute("DELETE FROM backfills WHERE sub = ?", (sub,))
+
+    def schedule(self, sub: str) -> Optional["SubSchedule"]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM schedule WHERE sub = ?", (sub,)).fetchone()
+        return SubSchedule(*row) if row else None
+
+    def schedules(self) -> List["SubSchedule"]:
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM schedule ORDER BY next_check").fetchall()
+        return [SubSchedule(*row) for row in rows]
+
+    def save_schedule(self, plan: "SubSchedule") -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO schedule VALUES (?, ?, ?, ?, ?, ?)", plan)
+
+    def due(self, subs: List[str], now: float) -> List[str]:
+        """Subscriptions whose next check has come (or that were never planned)."""
+        with self._lock:
+            planned = dict(self._db.execute("SELECT sub, next_check FROM schedule"))
+        return [sub for sub in subs if planned.get(sub, 0.0) <= now]
+
+    def next_due(self, subs: List[str]) -> float:
+        with self._lock:
+            planned = dict(self._db.execute("SELECT sub, next_check FROM schedule"))
+        return min((planned.get(sub, 0.0) for sub in subs), default=time.time() + POLL_MIN_INTERVAL)
+
+STATE: Optional[StateIndex] = None
+
+# ================== POLL SCHEDULE ==================
+class SubSchedule(NamedTuple):
+    sub: str
+    rate: Optional[float]        # newly listed IDs per day (moving average), None until measured
+    last_check: Optional[float]  # epoch seconds of the last finished check
+    next_check: float            # epoch seconds when the subscription is due again
+    depth: int                   # tag pages the next check expects to need
+    page_size: int               # IDs on a full tag page, as last seen
+
+def plan_next_check(sub: str, prev: Optional[SubSchedule], listed_new: Optional[int],
+                    page_size: int, now: float) -> SubSchedule:
+    """
+    Fold one finished check into sub's schedule. listed_new is the number of
+    IDs above the previous high-water mark (None when there was no mark to
+    compare with, which leaves the rate as it was).
+    """
+    rate = prev.rate if prev else None
+    if listed_new is not None and prev and prev.last_check:
+        days = max(now - prev.last_check, 60.0) / 86400
+        observed = listed_new / days
+        # weight by elapsed time, so frequent and rare checks converge alike
+        weight = 1 - 0.5 ** (days / POLL_RATE_HALF_LIFE_DAYS)
+        rate = observed if rate is None else rate + weight * (observed - rate)
+
+    if rate is None or not ADAPTIVE_POLLING:
+        interval = POLL_INTERVAL
+    elif rate <= 0:
+        interval = POLL_MAX_INTERVAL
+    else:
+        interval = POLL_TARGET_NEW / rate * 86400
+    interval = min(POLL_MAX_INTERVAL, max(POLL_MIN_INTERVAL, interval))
+
+    # pages that ~1.5x the expected arrivals fill by the next check
+    page_size = page_size or (prev.page_size if prev else 0) or 24
+    expected = (rate or 0.0) * interval / 86400
+    depth = min(MAX_PAGES_PER_TAG, max(1, math.ceil(1.5 * expected / page_size)))
+    return SubSchedule(sub, rate, now, now + interval, depth, page_size)
+
+def postpone_check(sub: str, delay: float) -> None:
+    """Push sub's next check back (after a failed check) without touching its rate."""
+    prev = STATE.schedule(sub)
+    STATE.save_schedule(SubSchedule(sub, prev.rate if prev else None, prev.last_check if prev else None,
+                                    time.time() + delay, prev.depth if prev else 1,
+                                    prev.page_size if prev else 24))
+
+def print_schedule(subs: List[str]) -> None:
+    """--schedule: one line per subscription with its rate, page depth and next check."""
+    now = time.time()
+    plans: Dict[str, SubSchedule] = {}
+    if STATE_DB.exists():
+        index = StateIndex(STATE_DB)
+        try:
+            plans = {p.sub: p for p in index.schedules()}
+        finally:
+            index.close()
+    print(f"{'subscription':32} {'new/day':>8} {'depth':>5}  {'last check':16}  next check")
+    for sub in sorted(set(subs) | set(plans), key=lambda s: plans[s].next_check if s in plans else 0.0):
+        p = plans.get(sub)
+        if p is None:
+            print(f"{sub:32} {'-':>8} {'-':>5}  {'never':16}  now")
             continue
-        m = rx_pair.match(p.name) or rx_id.match(p.name)
-        if m:
-            ids.add(m.group(1))
-    return ids
+        rate = "-" if p.rate is None else f"{p.rate:.2f}"
+        last = time.strftime("%Y-%m-%d %H:%M", time.localtime(p.last_check)) if p.last_check else "never"
+        due = "now" if p.next_check <= now else f"in {(p.next_check - now) / 3600:.1f} h"
+        note = "" if sub in subs else "  (not subscribed)"
+        print(f"{sub:32} {rate:>8} {p.depth:>5}  {last:16}  {due}{note}")
+
+# ================== TOMBSTONES ==================
+class Tombstone(NamedTuple):
+    img_id: str
+    sub: str            # subscription it was queued for
+    kind: str           # "missing" or "transient", a key of TOMBSTONE_BACKOFF
+    status: int         # last HTTP status (0: no answer)
+    failures: int       # consecutive failures of this kind
+    first_failed: float
+    last_failed: float
+    retry_at: float     # epoch seconds after which the ID may be queued again
+
+def failure_kind(statuses: List[int]) -> str:
+    """A definite "not there" from every candidate is missing; anything else may pass."""
+    return "missing" if statuses and all(s in (403, 404, 410) for s in statuses) else "transient"
+
+def tombstone_delay(kind: str, failures: int) -> float:
+    first, cap = TOMBSTONE_BACKOFF[kind]
+    return min(cap, first * 2 ** min(failures - 1, 32))
+
+def print_tombstones(kind: Optional[str] = None) -> None:
+    """--tombstones: one line per failed image with its failure class and next retry."""
+    tombs: List[Tombstone] = []
+    if STATE_DB.exists():
+        index = StateIndex(STATE_DB)
+        try:
+            tombs = index.tombstones(kind)
+        finally:
+            index.close()
+    now = time.time()
+    print(f"{'id':>10}  {'kind':9} {'status':>6} {'fails':>5}  {'last failure':16}  {'retry':10}  subscription")
+    for t in tombs:
+        last = time.strftime("%Y-%m-%d %H:%M", time.localtime(t.last_failed))
+        retry = "now" if t.retry_at <= now else f"in {(t.retry_at - now) / 86400:.1f} d"
+        print(f"{t.img_id:>10}  {t.kind:9} {t.status or '-':>6} {t.failures:>5}  {last:16}  {retry:10}  {t.sub or '-'}")
+    counts = Counter(t.kind for t in tombs)
+    print(f"{len(tombs)} tombstone(s)" + "".join(f", {n} {k}" for k, n in sorted(counts.items())))
+
+def clear_tombstones(targets: List[str]) -> None:
+    """--clear-tombstones [ID|KIND ...]: forget failures so the images are tried on the next run."""
+    if not STATE_DB.exists():
+        print("0 tombstone(s) cleared")
+        return
+    index = StateIndex(STATE_DB)
+    try:
+        kinds = [t for t in targets if t in TOMBSTONE_BACKOFF]
+        ids = [t for t in targets if t not in TOMBSTONE_BACKOFF]
+        cleared = index.clear_tombstones(ids) if ids else 0
+        if kinds:
+            cleared += sum(index.clear_tombstones(kind=k) for k in kinds)
+        elif not ids:
+            cleared = index.clear_tombstones()
+    finally:
+        index.close()
+    print(f"{cleared} tombstone(s) cleared")
+
+# ================== PAGE CACHE ==================
+class CachedPage(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    page: "PageIds"
+
+def _page_ids_to_json(page: "PageIds") -> str:
+    return json.dumps({"ids": page.ids, "ext": page.ext})
+
+def _page_ids_from_json(raw: str) -> "PageIds":
+    data = json.loads(raw)
+    return PageIds(data["ids"], data["ext"])
+
+class PageCache:
+    """
+    Validators (ETag / Last-Modified) and extracted IDs per tag-page URL,
+    plus extracted IDs per page-body hash, kept in SQLite. Each table is
+    bounded by least-recent use. Hit counters cover the current run.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS pages (
+        url           TEXT PRIMARY KEY,
+        etag          TEXT,
+        last_modified TEXT,
+        ids           TEXT NOT NULL,
+        used_at       REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS pages_used_at ON pages (used_at);
+    CREATE TABLE IF NOT EXISTS parsed (
+        body_hash TEXT PRIMARY KEY,
+        ids       TEXT NOT NULL,
+        used_at   REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS parsed_used_at ON parsed (used_at);
+    """
+
+    def __init__(self, path: Path, max_entries: int, max_parsed: int):
+        self.max_entries = max_entries
+        self.max_parsed = max_parsed
+        self.not_modified = 0
+        self.parse_hits = 0
+        self.parse_misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, ids FROM pages WHERE url = ?", (url,)).fetchone()
+        return CachedPage(row[0], row[1], _page_ids_from_json(row[2])) if row else None
+
+    def touch(self, url: str) -> None:
+        with self._lock:
+            self.not_modified += 1
+            self._db.execute("UPDATE pages SET used_at = ? WHERE url = ?", (time.time(), url))
+
+    def get_parsed(self, body_hash: str) -> Optional["PageIds"]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT ids FROM parsed WHERE body_hash = ?", (body_hash,)).fetchone()
+            if row is None:
+                self.parse_misses += 1
+                return None
+            self.parse_hits += 1
+            self._db.execute("UPDATE parsed SET used_at = ? WHERE body_hash = ?",
+                             (time.time(), body_hash))
+        return _page_ids_from_json(row[0])
+
+    def put_parsed(self, body_hash: str, page: "PageIds") -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO parsed VALUES (?, ?, ?)",
+                             (body_hash, _page_ids_to_json(page), time.time()))
+            self._db.execute(
+                "DELETE FROM parsed WHERE body_hash IN (SELECT body_hash FROM parsed "
+                "ORDER BY used_at DESC LIMIT -1 OFFSET ?)", (self.max_parsed,))
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str], page: "PageIds") -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                             (url, etag, last_modified, _page_ids_to_json(page), time.time()))
+            self._db.execute(
+                "DELETE FROM pages WHERE url IN (SELECT url FROM pages "
+                "ORDER BY used_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+PAGE_CACHE: Optional[PageCache] = None
+
+# ================== DOWNLOAD QUEUE ==================
+class QueuedImage(NamedTuple):
+    img_id: str
+    sub: str            # first subscription that asked for it (names the download URL)
+    ext: Optional[str]  # extension hint from the tag page
+
+class DownloadQueue:
+    """
+    Persistent work list of images to fetch, shared by every subscription
+    (SQLite in WAL mode). One entry per image ID, with one destination per
+    subscription that wants it. Entries stay until done(), so whatever a
+    killed run had not finished is still queued next time.
+    Order: priority band (new listings before deep backfill), then newest ID.
+    Safe to share between threads; claim() blocks while scanners are feeding.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS queue (
+        img_id      TEXT PRIMARY KEY,
+        num_id      INTEGER NOT NULL,
+        priority    INTEGER NOT NULL,
+        sub         TEXT NOT NULL,
+        ext         TEXT,
+        enqueued_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS queue_order ON queue (priority DESC, num_id DESC);
+    CREATE TABLE IF NOT EXISTS queue_dest (
+        img_id TEXT NOT NULL,
+        sub    TEXT NOT NULL,
+        PRIMARY KEY (img_id, sub)
+    );
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._cond = threading.Condition()
+        self._claimed: Set[str] = set()
+        self._feeding = False
+        self._stopped = False
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+
+    def close(self) -> None:
+        with self._cond:
+            self._db.close()
+
+    def pending(self) -> int:
+        with self._cond:
+            return self._db.execute("SELECT count(*) FROM queue").fetchone()[0]
+
+    def put(self, sub: str, img_id: str, ext: Optional[str] = None, priority: int = 0) -> None:
+        """Queue img_id for sub; an ID that is already queued just gains a destination."""
+        with self._cond:
+            self._db.execute("BEGIN")
+            self._db.execute(
+                "INSERT INTO queue VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(img_id) DO UPDATE SET "
+                "priority = max(priority, excluded.priority), ext = coalesce(ext, excluded.ext)",
+                (img_id, int(img_id), priority, sub, ext, time.time()))
+            self._db.execute("INSERT OR IGNORE INTO queue_dest VALUES (?, ?)", (img_id, sub))
+            self._db.execute("COMMIT")
+            self._cond.notify()
+
+    def start_feeding(self) -> None:
+        with self._cond:
+            self._feeding, self._stopped = True, False
+
+    def stop_feeding(self) -> None:
+        """No more put()s are coming: claim() returns None once the queue is empty."""
+        with self._cond:
+            self._feeding = False
+            self._cond.notify_all()
+
+    def stop(self) -> None:
+        """Abandon the drain (entries stay queued for the next run)."""
+        with self._cond:
+            self._feeding, self._stopped = False, True
+            self._cond.notify_all()
+
+    def claim(self) -> Optional[QueuedImage]:
+        """Highest-priority entry no other worker holds, or None when drained."""
+        with self._cond:
+            while not self._stopped:
+                rows = self._db.execute(
+                    "SELECT img_id, sub, ext FROM queue ORDER BY priority DESC, num_id DESC LIMIT ?",
+                    (len(self._claimed) + 1,)).fetchall()
+                for img_id, sub, ext in rows:
+                    if img_id not in self._claimed:
+                        self._claimed.add(img_id)
+                        return QueuedImage(img_id, sub, ext)
+                if not self._feeding:
+                    return None
+                self._cond.wait(1.0)
+            return None
+
+    def release(self, img_id: str) -> None:
+        """Give a claimed entry back untouched, for any worker to claim again."""
+        with self._cond:
+            self._claimed.discard(img_id)
+            self._cond.notify_all()
+
+    def done(self, img_id: str) -> List[str]:
+        """Drop a claimed entry; returns every subscription that wanted it."""
+        with self._cond:
+            self._db.execute("BEGIN")
+            subs = [r[0] for r in self._db.execute(
+                "SELECT sub FROM queue_dest WHERE img_id = ? ORDER BY rowid", (img_id,))]
+            self._db.execute("DELETE FROM queue WHERE img_id = ?", (img_id,))
+            self._db.execute("DELETE FROM queue_dest WHERE img_id = ?", (img_id,))
+            self._db.execute("COMMIT")
+            self._claimed.discard(img_id)
+            self._cond.notify_all()
+        return subs
+
+DOWNLOAD_QUEUE: Optional[DownloadQueue] = None
 
 # ================== PRE/POST ==================
 def load_subscriptions(path: Path) -> List[str]:
     if not path.exists():
-        print(f"[ERROR] Subscriptions file not found: {path}")
+        logger.error("[ERROR] Subscriptions file not found: %s", path)
         return []
     subs = []
     with open(path, "r", encoding="utf-8") as f:
@@ -187,42 +2104,97 @@ def load_subscriptions(path: Path) -> List[str]:
             if not s or s.startswith("#"):
                 continue
             subs.append(s)
-    log(f"[INFO] Loaded {len(subs)} subscriptions: {subs}")
+    logger.info("[INFO] Loaded %d subscriptions: %s", len(subs), subs)
     return subs
 
 # ================== HTTP / PARSE ==================
-def get_soup(url: str, dump_name: Optional[str] = None) -> Optional[BeautifulSoup]:
-    log(f"[HTTP] GET {url}")
-    try:
-        r = SESSION.get(url, timeout=TIMEOUT)
-        log(f"[HTTP] -> {r.status_code} ({len(r.content)} bytes)")
-        text_lower = r.text.lower() if r.status_code == 200 else ""
+class PageFetch(NamedTuple):
+    status: int                 # HTTP status; 304 means the cached copy is still valid
+    html: Optional[str]         # page body from HTTP or the browser, None if unusable
+    headers: Mapping[str, str]  # response headers of the plain HTTP request
 
-        if r.status_code == 200 and ("just a moment" not in text_lower and "checking your browser" not in text_lower):
-            return BeautifulSoup(r.text, "lxml")
+def get_page_html(url: str, headers: Optional[Mapping[str, str]] = None) -> PageFetch:
+    logger.debug("[HTTP] GET %s", url)
 
-        # 503/guard page fallback:
-        if r.status_code in (429, 503) or "just a moment" in text_lower or "checking your browser" in text_lower:
-            log("[HTTP] Guard detected → trying Playwright fallback…")
-            return get_soup_via_playwright(url)
+    def attempt() -> HttpResponse:
+        with METRICS.phase("fetch_http") as m:
+            r = http_get(url, headers)
+            m.bytes = len(r.content)
+            if r.status_code not in (200, 304):
+                m.error = f"http_{r.status_code}"
+        logger.debug("[HTTP] -> %d (%d bytes)", r.status_code, len(r.content))
+        return r
 
-        return None
+    try:
+        r = RETRY.call(url, attempt)
+    except CircuitOpen as e:
+        logger.warning("[HTTP] %s", e)
+        return PageFetch(0, None, {})
+    except Interrupted:
+        return PageFetch(0, None, {})
     except Exception as e:
-        log(f"[ERR ] GET {url}: {e}")
-        # last-ditch Playwright try:
-        return get_soup_via_playwright(url)
+        logger.warning("[ERR ] GET %s: %s", url, e)
+        # retries are spent; last-ditch Playwright try:
+        return PageFetch(0, get_html_via_playwright(url), {})
 
+    guarded = is_guard_page(r)
+    if r.status_code == 200 and not guarded:
+        PAGE_PATH.hit()
+        return PageFetch(r.status_code, r.text, r.headers)
+    if r.status_code == 304:
+        PAGE_PATH.hit()
+        return PageFetch(r.status_code, None, r.headers)
 
-def find_thumbs_ul(soup: BeautifulSoup) -> Optional[BeautifulSoup]:
+    # 503/guard page fallback:
+    if r.status_code in (429, 503) or guarded:
+        logger.info("[HTTP] Guard detected → trying Playwright fallback…")
+        return PageFetch(r.status_code, get_html_via_playwright(url), {})
+
+    return PageFetch(r.status_code, None, r.headers)
+
+def dump_html(url: str, html: str) -> None:
+    if not SAVE_HTML_DEBUG:
+        return
+    dest = DEBUG_DIR / (re.sub(r"[^\w]+", "_", url) + ".html")
+    try:
+        DEBUG_DIR.mkdir(parents=True, exist_ok=True)
+        dest.write_text(html, encoding="utf-8")
+    except OSError as e:
+        logger.debug("[DEBUG] could not save %s: %s", dest.name, e)
+
+def get_soup(url: str, dump_name: Optional[str] = None) -> Optional["BeautifulSoup"]:
+    page = get_page_html(url)
+    if page.html is None:
+        return None
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(page.html, "lxml")
+
+def find_thumbs_ul(soup: "BeautifulSoup") -> Optional["BeautifulSoup"]:
     for sel in ("#thumbs2", "#thumbs3", "#thumbs", "ul[id^=thumbs]"):
         ul = soup.select_one(sel)
         if ul:
-            log(f"[DEBUG] Found thumbs container via '{sel}' (id={ul.get('id')})")
+            logger.debug("[DEBUG] Found thumbs container via '%s' (id=%s)", sel, ul.get("id"))
             return ul
-    log("[DEBUG] No thumbs container found")
+    logger.debug("[DEBUG] No thumbs container found")
     return None
 
-def extract_ids_from_ul(ul: BeautifulSoup) -> List[str]:
+_rx_id_href = re.compile(r"/(\d+)(?:[/?#]|$)")
+_rx_full_ext = re.compile(r"\.full\.(\d+)(\.(?:jpg|png))(?:[?#]|$)", re.IGNORECASE)
+
+class PageIds(NamedTuple):
+    ids: List[str]
+    ext: Dict[str, str]  # id -> ".jpg"/".png" where the markup links the full-size file
+
+def ext_hints_from_ul(ul: "BeautifulSoup") -> Dict[str, str]:
+    """id -> extension for every full-size static link (href or src) in the container."""
+    hints: Dict[str, str] = {}
+    for node in ul.select("[href*='.full.'], [src*='.full.']"):
+        m = _rx_full_ext.search(node.get("href") or node.get("src") or "")
+        if m:
+            hints.setdefault(m.group(1), m.group(2).lower())
+    return hints
+
+def extract_ids_from_ul(ul: "BeautifulSoup") -> List[str]:
     ids: Set[str] = set()
     lis = ul.find_all("li", recursive=False) or ul.find_all("li")
 
@@ -231,7 +2203,7 @@ def extract_ids_from_ul(ul: BeautifulSoup) -> List[str]:
         a_thumb = li.select_one("div > a.thumb")
         if a_thumb:
             href = a_thumb.get("href", "")
-            m = re.search(r"/(\d+)(?:[/?#]|$)", href)
+            m = _rx_id_href.search(href)
             if m:
                 ids.add(m.group(1))
                 continue
@@ -254,16 +2226,178 @@ def extract_ids_from_ul(ul: BeautifulSoup) -> List[str]:
 
         # D: any <a href="/123…">
         for a in li.select("a[href]"):
-            m = re.search(r"/(\d+)(?:[/?#]|$)", a["href"])
+            m = _rx_id_href.search(a["href"])
             if m:
                 ids.add(m.group(1))
                 break
 
-    log(f"[DEBUG] Extracted {len(ids)} IDs from container")
-    return sorted(ids)
+    logger.debug("[DEBUG] Extracted %d IDs from container", len(ids))
+    return sorted(ids, key=int)
+
+class _ThumbIdsTarget:
+    """
+    lxml parser target that pulls IDs out of every ul#thumbs* container in a
+    single streaming pass, without building a tree. Per <li> it keeps the
+    first hit of each strategy used by extract_ids_from_ul() and resolves
+    them in the same order: a.thumb href, a.fav[data-id], [data-id], a[href].
+    """
+    def __init__(self):
+        self.containers: Dict[str, List[str]] = {}
+        self.ext: Dict[str, str] = {}  # full-size links seen inside the containers
+        self._stack: List[str] = []
+        self._ul_depth = 0
+        self._ids: List[str] = []
+        self._li_depth = 0
+        self._li: List[Optional[str]] = []
+
+    def start(self, tag, attrib):
+        parent = self._stack[-1] if self._stack else None
+        self._stack.append(tag)
+        depth = len(self._stack)
+        if not self._ul_depth:
+            ul_id = attrib.get("id", "")
+            if tag == "ul" and ul_id.startswith("thumbs"):
+                self._ul_depth = depth
+                self._ids = self.containers.setdefault(ul_id, [])
+            return
+        if not self._li_depth:
+            if tag == "li" and depth == self._ul_depth + 1:
+                self._li_depth = depth
+                self._li = [None, None, None, None]
+            return
+        li = self._li
+        for attr in ("href", "src"):
+            link = attrib.get(attr)
+            if link and ".full." in link:
+                m = _rx_full_ext.search(link)
+                if m:
+                    self.ext.setdefault(m.group(1), m.group(2).lower())
+        if tag == "a":
+            classes = attrib.get("class", "").split()
+            href = attrib.get("href")
+            if li[0] is None and parent == "div" and "thumb" in classes:
+                li[0] = href or ""
+            if li[1] is None and "fav" in classes:
+                li[1] = attrib.get("data-id") or ""
+            if li[3] is None and href is not None:
+                m = _rx_id_href.search(href)
+                if m:
+                    li[3] = m.group(1)
+        if li[2] is None and "data-id" in attrib:
+            li[2] = attrib["data-id"]
+
+    def end(self, tag):
+        depth = len(self._stack)
+        if self._li_depth and depth == self._li_depth:
+            self._li_depth = 0
+            img_id = self._resolve(self._li)
+            if img_id:
+                self._ids.append(img_id)
+        elif self._ul_depth and depth == self._ul_depth:
+            self._ul_depth = 0
+        self._stack.pop()
+
+    @staticmethod
+    def _resolve(li: List[Optional[str]]) -> Optional[str]:
+        thumb_href, fav_id, data_id, href_id = li
+        if thumb_href:
+            m = _rx_id_href.search(thumb_href)
+            if m:
+                return m.group(1)
+        for did in (fav_id, data_id):
+            if did and did.isdigit():
+                return did
+        return href_id
+
+    def data(self, data):
+        pass
+
+    def close(self):
+        return self.containers
+
+def extract_page_fast(html: str) -> PageIds:
+    """
+    Streaming counterpart of find_thumbs_ul() + extract_ids_from_ul(), plus
+    extension hints. IDs are empty when no thumbs container (or no ID) was found.
+    """
+    target = _ThumbIdsTarget()
+    from lxml import etree
+    parser = etree.HTMLParser(target=target)
+    parser.feed(html)
+    containers = parser.close()
+    for name in ("thumbs2", "thumbs3", "thumbs"):
+        if containers.get(name):
+            return PageIds(sorted(set(containers[name]), key=int), target.ext)
+    for ids in containers.values():
+        if ids:
+            return PageIds(sorted(set(ids), key=int), target.ext)
+    return PageIds([], {})
+
+def extract_ids_fast(html: str) -> List[str]:
+    return extract_page_fast(html).ids
+
+def ids_from_html(html: str) -> PageIds:
+    page = extract_page_fast(html)
+    if page.ids:
+        logger.debug("[DEBUG] Extracted %d IDs (fast path)", len(page.ids))
+        return page
+    # unusual markup: fall back to the multi-strategy BeautifulSoup path
+    from bs4 import BeautifulSoup
+    ul = find_thumbs_ul(BeautifulSoup(html, "lxml"))
+    if not ul:
+        return PageIds([], {})
+    return PageIds(extract_ids_from_ul(ul), ext_hints_from_ul(ul))
+
+def ids_from_html_cached(html: str) -> PageIds:
+    """ids_from_html() memoized by a hash of the page body."""
+    if not PAGE_CACHE:
+        with METRICS.phase("parse") as m:
+            m.bytes = len(html)
+            return ids_from_html(html)
+    body_hash = hashlib.blake2b(html.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+    page = PAGE_CACHE.get_parsed(body_hash)
+    if page is not None:
+        logger.debug("[DEBUG] Same page body as before → %d cached IDs", len(page.ids))
+        METRICS.count("parse_cache_hit")
+        return page
+    with METRICS.phase("parse") as m:
+        page = ids_from_html(html)
+        m.bytes = len(html)
+    if page.ids:
+        PAGE_CACHE.put_parsed(body_hash, page)
+    return page
+
+def fetch_page_ids(url: str, refresh: bool = False) -> Optional[PageIds]:
+    """
+    IDs on one tag page. Sends If-None-Match/If-Modified-Since from the page
+    cache and reuses the stored IDs on 304; refresh=True skips the validators.
+    Returns None when the page could not be fetched, which is not the same
+    as a page without IDs (past the end of the listing, or a 404 tag).
+    """
+    cached = PAGE_CACHE.get(url) if PAGE_CACHE and not refresh else None
+    headers: Dict[str, str] = {}
+    if cached:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+    page = get_page_html(url, headers or None)
+    if page.status == 304 and cached:
+        logger.debug("[HTTP] 304 not modified → %d cached IDs", len(cached.page.ids))
+        METRICS.count("page_not_modified")
+        PAGE_CACHE.touch(url)
+        return cached.page
+    if page.html is None:
+        return PageIds([], {}) if page.status in (404, 410) else None
+    dump_html(url, page.html)
+    found = ids_from_html_cached(page.html)
+    etag, last_modified = page.headers.get("ETag"), page.headers.get("Last-Modified")
+    if PAGE_CACHE and page.status == 200 and found.ids and (etag or last_modified):
+        PAGE_CACHE.put(url, etag, last_modified, found)
+    return found
 
 # ================== CORE ==================
-def page_urls_for_subscription(sub_plus: str, max_pages: int) -> List[str]:
+def page_url(sub_plus: str, page: int) -> str:
     """
     Build: page 1 = https://www.zerochan.net/<slug>
            page n = …?p=n
@@ -271,107 +2405,573 @@ def page_urls_for_subscription(sub_plus: str, max_pages: int) -> List[str]:
     """
     normalized = unquote(sub_plus).replace(" ", "+")
     slug = quote(normalized, safe="+")  # prevents % -> %25 double-encoding
-    base = f"https://www.zerochan.net/{slug}"
-    urls = [base]
-    for i in range(2, max_pages + 1):
-        urls.append(f"{base}?p={i}")
-    return urls
+    base = f"{WWW_BASE}/{slug}"
+    return base if page <= 1 else f"{base}?p={page}"
 
-def static_candidates(sub_plus: str, img_id: str) -> List[str]:
+def static_candidates(sub_plus: str, img_id: str, first_ext: str = ".jpg") -> List[str]:
     """
-    Make .jpg first, then .png
+    Make .jpg first, then .png (or first_ext first when we know better)
     https://static.zerochan.net/<Name.Dots>.full.<id>.jpg
     """
     name_dots = sub_plus.replace("+", ".")
-    base = f"https://static.zerochan.net/{name_dots}.full.{img_id}"
-    return [base + ".jpg", base + ".png"]
+    base = f"{STATIC_BASE}/{name_dots}.full.{img_id}"
+    exts = [".png", ".jpg"] if first_ext == ".png" else [".jpg", ".png"]
+    return [base + ext for ext in exts]
+
+def download_status(url: str, dest: pathlib.Path) -> int:
+    """GET url into dest; returns the HTTP status (200 = saved), or 0 if there was no answer."""
+    def attempt() -> HttpResponse:
+        with METRICS.phase("download") as m:
+            r = http_download(url, dest)
+            if r.status_code == 200:
+                m.bytes = dest.stat().st_size
+            else:
+                m.error = f"http_{r.status_code}"
+        logger.debug("    [DL ] GET %s -> %d", url, r.status_code)
+        return r
+
+    try:
+        r = RETRY.call(url, attempt)
+    except (CircuitOpen, Interrupted):
+        raise  # not an answer about this image: drain_queue puts it back
+    except Exception as e:
+        logger.warning("    [ERR] download %s: %s", url, e)
+        return 0
+    if r.status_code == 200:
+        logger.debug("    [OK ] saved: %s", dest.name)
+    return r.status_code
 
 def download(url: str, dest: pathlib.Path) -> bool:
+    return download_status(url, dest) == 200
+
+class RunOptions(NamedTuple):
+    rescan: bool = False    # ignore the state index and rescan folders
+    backfill: bool = False  # deep-walk every subscription's tag pages
+    refresh: bool = False   # bypass the conditional-GET page cache
+    all_subs: bool = False  # check every subscription, due or not
+
+def due_subscriptions(subs: List[str], opts: RunOptions) -> List[str]:
+    if opts.all_subs or opts.backfill or not ADAPTIVE_POLLING:
+        return list(subs)
+    return STATE.due(subs, time.time())
+
+class ScanResult(NamedTuple):
+    queued: int = 0                # missing IDs handed to the download queue
+    listed_new: Optional[int] = 0  # IDs above the previous high-water mark (None: no mark yet)
+
+def process_subscription(sub: str, opts: RunOptions = RunOptions()) -> ScanResult:
+    """
+    Scan one subscription's tag pages and queue its missing IDs for download.
+    """
+    # Folder per character
+    char_folder_name = folder_name_from_subscription(sub)
+    char_folder = DEST_DIR / char_folder_name
+    char_folder.mkdir(parents=True, exist_ok=True)
+    logger.info("[SUB] %s  → folder: %s", sub, char_folder_name)
+
+    # Preflight: stored IDs from the index (folder is only rescanned if it changed)
+    with METRICS.phase("scan"):
+        have_ids = STATE.existing_ids(sub, char_folder, rescan=opts.rescan)
+    logger.debug("  [INFO] %s: stored IDs in folder: %d", sub, len(have_ids))
+
+    # Newest-first paging: incremental runs stop at the first fully known page,
+    # or once past the expected depth at the first page that reaches the
+    # high-water mark; deep backfill keeps going until the listing runs out.
+    # A deep walk stays pending until one finishes, so an interrupted or
+    # failed one is walked again next time.
+    high_water = STATE.high_water(sub)
+    plan = STATE.schedule(sub)
+    depth = plan.depth if plan and ADAPTIVE_POLLING else MAX_PAGES_PER_TAG
+    deep = (opts.backfill or STATE.backfill_pending(sub)
+            or (BACKFILL_NEW_SUBS and high_water is None and not have_ids))
+    if deep:
+        STATE.set_backfill_pending(sub, True)
+        pages = itertools.count(1) if BACKFILL_MAX_PAGES <= 0 else range(1, BACKFILL_MAX_PAGES + 1)
+        logger.info("  [INFO] %s: deep backfill", sub)
+    else:
+        pages = range(1, MAX_PAGES_PER_TAG + 1)
+
+    now = time.time()
+    # failed images come back when their tombstone expires, wherever they are listed
+    requeued = requeue_expired_tombstones(sub, have_ids, now)
+
+    def known(img_id: int) -> bool:
+        # stored, or failed too recently to retry; being under the mark proves nothing
+        return img_id in have_ids or STATE.tombstoned(str(img_id), now)
+
+    found: Set[int] = set()  # small (a few pages); kept compact once complete
+    ext_hints: Dict[str, str] = {}
+    page_size = 0
+    failed_pages = failed_in_row = 0
+    for page in pages:
+        if SHUTDOWN.is_set():
+            return ScanResult()  # unfinished pass: nothing queued, the mark stays put
+        result = fetch_page_ids(page_url(sub, page), refresh=opts.refresh)
+        if result is None:
+            # no answer is not the end of the listing: skip the page, but the
+            # pass is unfinished (the mark stays put)
+            failed_pages += 1
+            failed_in_row += 1
+            if failed_in_row >= 3:
+                logger.warning("  [WARN] %s: %d tag pages in a row failed → giving up this pass",
+                               sub, failed_in_row)
+                break
+            continue
+        failed_in_row = 0
+        ids, hints = result
+        ext_hints.update(hints)
+        if not ids:
+            if deep:
+                break  # past the last page
+            continue
+        page_ids = [int(i) for i in ids]
+        if found.issuperset(page_ids):
+            # a repeat of an earlier page: ?p= is clamped or ignored past the end
+            logger.debug("  [INFO] %s: page %d lists nothing new → end of the listing", sub, page)
+            break
+        found.update(page_ids)
+        page_size = max(page_size, len(ids))
+        if INCREMENTAL and not deep and all(known(i) for i in page_ids):
+            logger.debug("  [INFO] %s: page %d fully known → stop paging", sub, page)
+            break
+        if (INCREMENTAL and not deep and page >= depth and high_water is not None
+                and any(i <= high_water for i in page_ids)):
+            logger.debug("  [INFO] %s: page %d reaches the high-water mark → stop paging", sub, page)
+            break
+
+    all_found_ids = IdSet(found)
+    if not all_found_ids:
+        logger.info("  [INFO] %s: no IDs found on tag pages.", sub)
+        if failed_pages:
+            postpone_check(sub, POLL_MIN_INTERVAL)  # an outage is not a quiet tag
+            return ScanResult(len(requeued), None)
+        if deep:
+            STATE.set_backfill_pending(sub, False)
+        STATE.save_schedule(plan_next_check(sub, plan, None, page_size, time.time()))
+        return ScanResult(len(requeued))
+
+    # Filter to only missing IDs for this character (ascending, numerically)
+    missing_ids = all_found_ids.difference(have_ids)
+    logger.info("  [INFO] %s: found %d ids; missing %d new", sub, len(all_found_ids), len(missing_ids))
+
+    # Hand them to the shared queue; backfill work waits behind fresh listings.
+    # IDs that failed recently are left out until their tombstone expires.
+    priority = 0 if deep else 1
+    queued = len(requeued)
+    for n in missing_ids:
+        img_id = str(n)
+        if STATE.tombstoned(img_id, now):
+            METRICS.count("skipped_tombstoned")
+            continue
+        DOWNLOAD_QUEUE.put(sub, img_id, ext_hints.get(img_id), priority)
+        if img_id not in requeued:  # already counted; the page only adds its hint and priority
+            queued += 1
+
+    # Only a finished pass moves the mark (its IDs are safely queued by now);
+    # an interrupted one, or one with pages that failed, re-walks next time.
+    if failed_pages:
+        # not a finished check either: retry soon, and leave the rate alone
+        logger.info("  [INFO] %s: %d tag page(s) could not be fetched → mark stays at %s, "
+                    "checking again in %d min", sub, failed_pages, high_water, POLL_MIN_INTERVAL // 60)
+        postpone_check(sub, POLL_MIN_INTERVAL)
+        return ScanResult(queued, None)
+    STATE.set_high_water(sub, all_found_ids.max())
+    if deep:
+        STATE.set_backfill_pending(sub, False)
+    listed_new = None if high_water is None else all_found_ids.count_above(high_water)
+    plan = plan_next_check(sub, plan, listed_new, page_size, time.time())
+    STATE.save_schedule(plan)
+    logger.debug("  [POLL] %s: %s new listed, ~%s/day → next check in %.1f h, %d page(s)", sub,
+                 listed_new, "?" if plan.rate is None else f"{plan.rate:.2f}",
+                 (plan.next_check - time.time()) / 3600, plan.depth)
+    return ScanResult(queued, listed_new)
+
+def requeue_expired_tombstones(sub: str, have_ids: IdSet, now: float) -> Set[str]:
+    """
+    Queue sub's failed images whose tombstone has expired, whether or not
+    this check's tag pages reach them. Returns the IDs queued.
+    """
+    queued: Set[str] = set()
+    for tomb in STATE.expired_tombstones(sub, now):
+        if int(tomb.img_id) in have_ids:
+            STATE.clear_tombstone(tomb.img_id)  # stored in the meantime
+            continue
+        DOWNLOAD_QUEUE.put(sub, tomb.img_id, None, 0)
+        queued.add(tomb.img_id)
+    if queued:
+        METRICS.count("tombstone_requeued", len(queued))
+        logger.debug("  [INFO] %s: %d failed image(s) due for another try", sub, len(queued))
+    return queued
+
+def image_dest(sub: str, img_id: str, ext: str) -> Path:
+    # Filenames use the dotted form: <Name.Dots>_<id>.<ext>
+    return DEST_DIR / folder_name_from_subscription(sub) / f"{sub.replace('+', '.')}_{img_id}{ext}"
+
+def fetch_image(item: QueuedImage) -> Tuple[Optional[Path], bool]:
+    """
+    Get one queued image into the blob store. Reuses a blob or any copy
+    already stored for a subscription before going to the network; the
+    seen filter skips those lookups for IDs that are certainly new.
+    Returns (path or None, whether it was downloaded).
+    """
+    if not STATE.might_have(item.img_id):
+        METRICS.count("seen_filter_skipped")
+    else:
+        blob = find_blob(item.img_id)
+        if blob:
+            logger.debug("    [SKIP] id=%s already in the blob store", item.img_id)
+            return blob, False
+        for ext in (".jpg", ".png"):
+            dest = image_dest(item.sub, item.img_id, ext)
+            if dest.exists():
+                logger.debug("    [SKIP] exists: %s", dest.name)
+                return adopt_blob(dest, item.img_id), False
+        stored = STATE.find(item.img_id)
+        if stored:
+            logger.debug("    [SKIP] id=%s already stored as %s", item.img_id, stored.name)
+            METRICS.count("dedupe_local")
+            return adopt_blob(stored, item.img_id), False
+        METRICS.count("seen_filter_false_positive")  # or a file deleted since
+
+    # The first candidate is the markup's extension when the page linked the
+    # full file, else the folder's usual one.
+    first_ext = item.ext or STATE.likely_ext(item.sub)
+    blob_path(item.img_id, first_ext).parent.mkdir(parents=True, exist_ok=True)
+    statuses = []
+    for attempt, cand in enumerate(static_candidates(item.sub, item.img_id, first_ext)):
+        ext = ".jpg" if cand.endswith(".jpg") else ".png"
+        blob = blob_path(item.img_id, ext)
+        # one GET (no HEAD) to be gentler; download_status() takes a token from its host's bucket
+        status = download_status(cand, blob)
+        if status == 200:
+            if item.ext:
+                METRICS.count("ext_hinted")
+            if attempt:
+                METRICS.count("ext_mispredicted")
+            elif ext == ".png":
+                METRICS.count("ext_roundtrips_saved")  # a jpg-first probe would have 404'd
+            STATE.add_seen(item.img_id)
+            return blob, True
+        statuses.append(status)
+    # not queued again until the tombstone expires (longer for each repeat)
+    tomb = STATE.add_tombstone(item.img_id, item.sub, failure_kind(statuses), statuses[-1])
+    METRICS.count(f"tombstoned_{tomb.kind}")
+    logger.warning("    [MISS] Could not fetch id=%s as jpg/png (%s, HTTP %s); retry in %.1f day(s)",
+                   item.img_id, tomb.kind, tomb.status or "-", (tomb.retry_at - tomb.last_failed) / 86400)
+    return None, False
+
+def place_link(src: Path, sub: str, img_id: str, sha1: Optional[str] = None) -> None:
+    """Link a stored image into sub's folder (unless it is already there)."""
+    dest = image_dest(sub, img_id, src.suffix.lower())
+    if not dest.exists():
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        mode = link_file(src, dest)
+        METRICS.count(f"link_{mode}")
+        logger.debug("    [LINK] %s → %s (%s)", src.name, dest.parent.name, mode)
+    STATE.record(sub, img_id, dest, sha1)
+
+def drain_queue(dl_queue: DownloadQueue) -> int:
+    """Download worker: work through the queue until it is drained. Returns files downloaded."""
+    downloaded = 0
+    waits = 0
+    while not SHUTDOWN.is_set():
+        item = dl_queue.claim()
+        if item is None:
+            return downloaded
+        try:
+            path, fetched = fetch_image(item)
+            sha1 = sha1_file(path) if fetched else None
+        except CircuitOpen as e:
+            # the host is cut off, not the image: hand it back and wait out the cooldown
+            dl_queue.release(item.img_id)
+            if e.probing:
+                # a slow probe is not another cooldown: wait for its verdict without counting
+                logger.debug("[DL  ] %s; probe in flight", e)
+                SHUTDOWN.wait(1.0)
+                continue
+            waits += 1
+            if waits > BREAKER_MAX_WAITS:
+                logger.warning("[DL  ] %s; leaving the rest of the queue for the next run", e)
+                return downloaded
+            logger.info("[DL  ] %s; waiting %.0fs", e, e.retry_in)
+            SHUTDOWN.wait(max(1.0, e.retry_in))
+            continue
+        except Interrupted:
+            dl_queue.release(item.img_id)  # shutting down: it stays queued for the next run
+            return downloaded
+        except Exception as e:
+            # back off like a failed fetch: a claim held until the run ends is
+            # never retried in watch mode
+            logger.exception("[ERR ] download id=%s: %s", item.img_id, e)
+            STATE.add_tombstone(item.img_id, item.sub, "transient", 0)
+            METRICS.count("tombstoned_transient")
+            dl_queue.done(item.img_id)
+            continue
+        waits = 0
+        downloaded += fetched
+        if path is not None:
+            STATE.clear_tombstone(item.img_id)
+        subs = dl_queue.done(item.img_id)
+        if len(subs) > 1:
+            METRICS.count("dedupe_shared", len(subs) - 1)
+        for sub in subs:
+            if path is None:
+                continue
+            try:
+                place_link(path, sub, item.img_id, sha1)
+            except Exception as e:
+                # not recorded for sub, so its next check queues the ID again
+                logger.exception("[ERR ] placing id=%s for %s: %s", item.img_id, sub, e)
+    return downloaded
+
+def _process_subscription_safe(sub: str, opts: RunOptions) -> ScanResult:
+    # One broken subscription must not take the whole pool down.
     try:
-        with SESSION.get(url, stream=True, timeout=TIMEOUT) as r:
-            log(f"    [DL ] GET {url} -> {r.status_code}")
-            if r.status_code != 200:
-                return False
-            with open(dest, "wb") as f:
-                for chunk in r.iter_content(chunk_size=65536):
-                    if chunk:
-                        f.write(chunk)
-        log(f"    [OK ] saved: {dest.name}")
-        return True
+        return process_subscription(sub, opts)
     except Exception as e:
-        log(f"    [ERR] download: {e}")
-        return False
+        logger.exception("[ERR ] subscription %s: %s", sub, e)
+        postpone_check(sub, POLL_MIN_INTERVAL)  # retry soon, but not in a tight loop
+        return ScanResult()
 
-def run():
-    print("Zerochan tag-scraper starting…")
-    subs = load_subscriptions(SUBSCRIPTIONS_FILE)
+def run(opts: RunOptions = RunOptions()):
+    setup_logging()
+    logger.info("Zerochan tag-scraper starting…")
+    METRICS.reset()
+    sinks = configure_metrics_sinks()
+    try:
+        _run(opts)
+    finally:
+        METRICS.emit()
+        for sink in sinks:
+            METRICS.remove_sink(sink)
+        shutdown_logging()
+
+def _run(opts: RunOptions) -> None:
+    DEST_DIR.mkdir(parents=True, exist_ok=True)
+    with METRICS.phase("load"):
+        subs = load_subscriptions(SUBSCRIPTIONS_FILE)
     if not subs:
-        print("[ABORT] No subscriptions found.")
+        logger.error("[ABORT] No subscriptions found.")
         return
 
+    # Start on the fast path if an earlier run's browser already cleared the guard
+    PAGE_PATH.reset()
+    load_browser_clearance()
+
     # >>> PRE-FLIGHT: migrate any legacy files from the root into per-character folders
-    migrate_root_files_to_char_folders(DEST_DIR, subs)
+    with METRICS.phase("migrate"):
+        migrate_root_files_to_char_folders(DEST_DIR, subs)
 
-    total_new = 0
+    page_cache, resumed = _open_stores()
+    try:
+        due = due_subscriptions(subs, opts)
+        if len(due) < len(subs):
+            logger.info("[POLL] %d of %d subscriptions are not due yet (--all checks them anyway, "
+                        "--schedule shows when)", len(subs) - len(due), len(subs))
+        with METRICS.phase("scan"):
+            STATE.refresh_library(due, rescan=opts.rescan)
+        scans, total_new = scan_and_download(due, opts._replace(rescan=False))
+    finally:
+        _close_stores()
+    _log_summary(total_new, sum(r.queued for r in scans.values()), resumed, page_cache)
 
-    for sub in subs:
-        # Folder per character
-        char_folder_name = folder_name_from_subscription(sub)
-        char_folder = DEST_DIR / char_folder_name
-        char_folder.mkdir(parents=True, exist_ok=True)
+def _open_stores() -> Tuple[PageCache, int]:
+    """Open the index, page cache and download queue; returns (page cache, queued downloads left over)."""
+    global STATE, PAGE_CACHE, DOWNLOAD_QUEUE
+    STATE = StateIndex(STATE_DB, SEEN_FILTER, TOMBSTONE_FILTER)
+    evicted = STATE.evict_tombstones(TOMBSTONE_TTL_DAYS)
+    if evicted:
+        logger.info("[INFO] Dropped %d tombstone(s) older than %d days", evicted, TOMBSTONE_TTL_DAYS)
+    PAGE_CACHE = PageCache(PAGE_CACHE_DB, PAGE_CACHE_MAX_ENTRIES, PARSE_CACHE_MAX_ENTRIES)
+    DOWNLOAD_QUEUE = DownloadQueue(QUEUE_DB)
+    resumed = DOWNLOAD_QUEUE.pending()
+    if resumed:
+        logger.info("[INFO] Resuming %d queued download(s) from an earlier run", resumed)
+    return PAGE_CACHE, resumed
 
-        # Filenames continue to use dotted form for consistency
-        char_dots = sub.replace("+", ".")
-        log(f"\n[SUB] {sub}  → folder: {char_folder_name}")
+def _close_stores() -> None:
+    global STATE, PAGE_CACHE, DOWNLOAD_QUEUE
+    close_fetcher()
+    close_browser_pool()
+    STATE.close()
+    PAGE_CACHE.close()
+    DOWNLOAD_QUEUE.close()
+    STATE = PAGE_CACHE = DOWNLOAD_QUEUE = None
 
-        # Preflight: only scan this character's folder
-        have_ids = build_existing_ids_for_char(char_folder)
-        log(f"  [INFO] Stored IDs in folder: {len(have_ids)}")
+def scan_and_download(subs: List[str], opts: RunOptions) -> Tuple[Dict[str, ScanResult], int]:
+    """
+    One pass over subs: scan workers each own whole subscriptions and feed
+    the download queue, which the download workers drain at the same time.
+    Returns (scan result per subscription, files downloaded). Results are
+    summed here, so the summary does not depend on shared counters.
+    """
+    workers = max(1, min(WORKERS, len(subs)))
+    logger.info("[INFO] Processing %d subscriptions with %d worker(s), %d download worker(s)",
+                len(subs), workers, DOWNLOAD_WORKERS)
+    dl_queue = DOWNLOAD_QUEUE
+    dl_queue.start_feeding()
+    with ThreadPoolExecutor(max_workers=max(1, DOWNLOAD_WORKERS), thread_name_prefix="dl") as dl_pool:
+        drains = [dl_pool.submit(drain_queue, dl_queue) for _ in range(max(1, DOWNLOAD_WORKERS))]
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sub") as pool:
+                scans = dict(zip(subs, pool.map(lambda sub: _process_subscription_safe(sub, opts), subs)))
+            dl_queue.stop_feeding()
+        except BaseException:
+            dl_queue.stop()
+            raise
+        return scans, sum(f.result() for f in drains)
 
-        # Gather IDs from the first N pages
-        all_found_ids: Set[str] = set()
-        for url in page_urls_for_subscription(sub, MAX_PAGES_PER_TAG):
-            soup = get_soup(url, dump_name=re.sub(r"[^\w]+", "_", url))
-            if not soup:
-                continue
-            ul = find_thumbs_ul(soup)
-            if not ul:
-                continue
-            ids = extract_ids_from_ul(ul)
-            all_found_ids.update(ids)
-            time.sleep(REQUEST_DELAY)
+def _log_summary(total_new: int, total_queued: int, resumed: int, page_cache: PageCache) -> None:
+    counters = METRICS.snapshot()["counters"]
+    logger.info("\n[SUMMARY] New images downloaded this run: %d", total_new)
+    logger.info("[SUMMARY] Queued: %d new, %d resumed; shared between subscriptions: %d, "
+                "reused from disk: %d", total_queued, resumed,
+                counters.get("dedupe_shared", 0), counters.get("dedupe_local", 0))
+    logger.info("[SUMMARY] Folder links: %d hardlinks, %d symlinks, %d copies",
+                counters.get("link_hardlink", 0), counters.get("link_symlink", 0),
+                counters.get("link_copy", 0))
+    logger.info("[SUMMARY] Tag pages via HTTP: %d, via browser fallback: %d",
+                PAGE_PATH.http_hits, PAGE_PATH.browser_misses)
+    parsed = page_cache.parse_hits + page_cache.parse_misses
+    hit_rate = 100.0 * page_cache.parse_hits / parsed if parsed else 0.0
+    logger.info("[SUMMARY] Page cache: %d not modified (304), parsed-ID cache %d/%d hits (%.0f%%)",
+                page_cache.not_modified, page_cache.parse_hits, parsed, hit_rate)
+    logger.info("[SUMMARY] Extension guesses: %d from tag-page links, %d .jpg 404s avoided, "
+                "%d wrong (extra request)", counters.get("ext_hinted", 0),
+                counters.get("ext_roundtrips_saved", 0), counters.get("ext_mispredicted", 0))
+    logger.info("[SUMMARY] Tombstones: %d IDs skipped, %d new missing, %d new transient "
+                "(--tombstones lists them)", counters.get("skipped_tombstoned", 0),
+                counters.get("tombstoned_missing", 0), counters.get("tombstoned_transient", 0))
+    retries = {k[len("retry_"):]: n for k, n in counters.items()
+               if k.startswith("retry_") and not k.startswith("retry_exhausted_")}
+    logger.info("[SUMMARY] Retries: %d (%s); gave up after retrying: %d; circuit breaker trips: %d",
+                sum(retries.values()), ", ".join(f"{k} {n}" for k, n in sorted(retries.items())) or "none",
+                sum(n for k, n in counters.items() if k.startswith("retry_exhausted_")),
+                counters.get("breaker_trips", 0))
+    logger.info("[SUMMARY] Lookups skipped by the seen filter: %d (%d false positives)",
+                counters.get("seen_filter_skipped", 0), counters.get("seen_filter_false_positive", 0))
+    logger.info("[DONE]")
 
-        if not all_found_ids:
-            log("  [INFO] No IDs found on tag pages.")
-            continue
+# ================== WATCH MODE ==================
+SHUTDOWN = threading.Event()
 
-        # Filter to only missing IDs for this character
-        missing_ids = [i for i in sorted(all_found_ids) if i not in have_ids]
-        log(f"  [INFO] Found {len(all_found_ids)} ids; missing {len(missing_ids)} new")
-
-        # Download into the character's folder
-        for img_id in missing_ids:
-            candidates = static_candidates(sub, img_id)
-            saved = False
-            for cand in candidates:
-                ext = ".jpg" if cand.endswith(".jpg") else ".png"
-                dest = char_folder / f"{char_dots}_{img_id}{ext}"
-                if dest.exists():
-                    log(f"    [SKIP] exists: {dest.name}")
-                    saved = True
-                    break
-                # one GET (no HEAD) to be gentler
-                if download(cand, dest):
-                    saved = True
+def _request_shutdown(signum, frame) -> None:
+    if SHUTDOWN.is_set():
+        raise KeyboardInterrupt  # second signal: stop right now
+    logger.info("[WATCH] signal %d → finishing current work, then exiting", signum)
+    SHUTDOWN.set()
+
+def watch(opts: RunOptions = RunOptions()) -> None:
+    """
+    Stay running and re-check each subscription when it is due (see
+    plan_next_check), keeping the HTTP session, browser, index, caches and
+    rate limiter warm between checks. SIGTERM/SIGINT finish the page or download
+    in hand and exit; unfinished downloads stay queued.
+    """
+    setup_logging()
+    logger.info("Zerochan tag-scraper watching…")
+    sinks = configure_metrics_sinks()
+    SHUTDOWN.clear()
+    handled = [signal.SIGINT, signal.SIGTERM] + ([signal.SIGBREAK] if hasattr(signal, "SIGBREAK") else [])
+    previous = {sig: signal.signal(sig, _request_shutdown) for sig in handled}
+    try:
+        _watch(opts)
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+        for sink in sinks:
+            METRICS.remove_sink(sink)
+        logger.info("[WATCH] stopped")
+        shutdown_logging()
+
+def _watch(opts: RunOptions) -> None:
+    DEST_DIR.mkdir(parents=True, exist_ok=True)
+    PAGE_PATH.reset()
+    load_browser_clearance()
+    page_cache, _ = _open_stores()
+    subs: List[str] = []
+    subs_mtime: Optional[int] = None
+    try:
+        while not SHUTDOWN.is_set():
+            # subscriptions.txt is re-read whenever it changes
+            mtime = SUBSCRIPTIONS_FILE.stat().st_mtime_ns if SUBSCRIPTIONS_FILE.exists() else None
+            if mtime != subs_mtime:
+                subs_mtime = mtime
+                with METRICS.phase("load"):
+                    subs = load_subscriptions(SUBSCRIPTIONS_FILE)
+                with METRICS.phase("migrate"):
+                    migrate_root_files_to_char_folders(DEST_DIR, subs)
+
+            # every check records its own next one (see process_subscription)
+            due = due_subscriptions(subs, opts)
+            if due or DOWNLOAD_QUEUE.pending():
+                METRICS.reset()
+                with METRICS.phase("scan"):
+                    STATE.refresh_library(due, rescan=opts.rescan)
+                scans, downloaded = scan_and_download(due, opts._replace(rescan=False))
+                opts = RunOptions()  # --rescan/--backfill/--refresh/--all apply to the first pass only
+                if SHUTDOWN.is_set():
                     break
-            if not saved:
-                log(f"    [MISS] Could not fetch id={img_id} as jpg/png")
-            time.sleep(REQUEST_DELAY)
+                METRICS.emit()
+                logger.info("[WATCH] checked %d subscription(s): %d queued, %d downloaded "
+                            "(304s so far: %d)", len(due), sum(r.queued for r in scans.values()),
+                            downloaded, page_cache.not_modified)
 
-        total_new += len(missing_ids)
+            wait = STATE.next_due(subs) - time.time()
+            if wait > 0:
+                logger.info("[WATCH] next check in %.0f min", wait / 60)
+                SHUTDOWN.wait(wait)
+    finally:
+        _close_stores()
 
-    print(f"\n[SUMMARY] New images downloaded this run: {total_new}")
-    print("[DONE]")
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(
+        description="Download new Zerochan images for the tags in subscriptions.txt.")
+    ap.add_argument("--rescan", action="store_true",
+                    help="ignore the state index and rescan every character folder")
+    ap.add_argument("--backfill", action="store_true",
+                    help="walk every tag page of every subscription, not just the new ones")
+    ap.add_argument("--refresh", action="store_true",
+                    help="re-download every tag page instead of sending conditional requests")
+    ap.add_argument("--log-json", action="store_true",
+                    help="log one JSON object per line")
+    ap.add_argument("--log-file", type=Path, metavar="PATH",
+                    help="also append the log to PATH")
+    ap.add_argument("--metrics-jsonl", type=Path, metavar="PATH",
+                    help="append per-run phase metrics as JSON lines to PATH")
+    ap.add_argument("--metrics-prom", type=Path, metavar="PATH",
+                    help="write phase metrics as a Prometheus textfile to PATH")
+    ap.add_argument("--watch", action="store_true",
+                    help="keep running and re-check each subscription on its own schedule")
+    ap.add_argument("--all", action="store_true", dest="all_subs",
+                    help="check every subscription now, even those not due yet")
+    ap.add_argument("--schedule", action="store_true",
+                    help="print each subscription's polling schedule and exit")
+    ap.add_argument("--tombstones", nargs="?", const="all", choices=("all", *TOMBSTONE_BACKOFF),
+                    help="list images that failed to download (optionally one kind) and exit")
+    ap.add_argument("--clear-tombstones", nargs="*", metavar="ID|KIND",
+                    help="forget failed images (all, one kind, or the given IDs) and exit")
+    args = ap.parse_args(argv)
+    if args.schedule:
+        print_schedule(load_subscriptions(SUBSCRIPTIONS_FILE))
+        return
+    if args.tombstones:
+        print_tombstones(None if args.tombstones == "all" else args.tombstones)
+        return
+    if args.clear_tombstones is not None:
+        clear_tombstones(args.clear_tombstones)
+        return
+    global METRICS_JSONL, METRICS_PROM_FILE, LOG_JSON, LOG_FILE
+    LOG_JSON = args.log_json or LOG_JSON
+    LOG_FILE = args.log_file or LOG_FILE
+    METRICS_JSONL = args.metrics_jsonl or METRICS_JSONL
+    METRICS_PROM_FILE = args.metrics_prom or METRICS_PROM_FILE
+    opts = RunOptions(rescan=args.rescan, backfill=args.backfill, refresh=args.refresh,
+                      all_subs=args.all_subs)
+    if args.watch:
+        watch(opts)
+    else:
+        run(opts)
 
 if __name__ == "__main__":
-    run()
+    main()